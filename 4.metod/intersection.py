@@ -0,0 +1,162 @@
+import sys
+
+
+class Intersection:
+    def __init__(self, name, incoming_roads, traffic_lights, cell_bounds, occupancy, reward_weights, speed_channel='none', speed_decimals=1, lane_reference=False, layout='cells', green_phase=0, yellow_phase=1, red_phase=2):
+        self._name = name
+        self._incoming_roads = tuple(incoming_roads)  # in the order of the roads in the state
+        self._traffic_lights = tuple(traffic_lights)  # action n gives the green to the n-th traffic light
+        self._cell_bounds = tuple(cell_bounds)  # distance in meters from the traffic light where the cells of a road end
+        self._occupancy = occupancy  # vehicle type -> value written in the cell of a car, only these types are observed
+        self._reward_weights = reward_weights  # vehicle type -> weight of its waiting time in the reward
+        self._speed_channel = speed_channel  # none, last or mean
+        self._speed_decimals = speed_decimals  # decimals kept of the speed of the last car of a cell, last channel only
+        self._lane_reference = lane_reference  # distance and speed measured against the lane instead of the road and the max speed of the car
+        self._layout = layout  # cells (one value for every cell of every road) or lanes (channels for every cell of every lane)
+        self._green_phase = green_phase  # position of the phases in the program of the traffic lights
+        self._yellow_phase = yellow_phase
+        self._red_phase = red_phase
+
+
+    @property
+    def name(self):
+        return self._name
+
+
+    @property
+    def incoming_roads(self):
+        return self._incoming_roads
+
+
+    @property
+    def traffic_lights(self):
+        return self._traffic_lights
+
+
+    @property
+    def cell_bounds(self):
+        return self._cell_bounds
+
+
+    @property
+    def occupancy(self):
+        return self._occupancy
+
+
+    @property
+    def reward_weights(self):
+        return self._reward_weights
+
+
+    @property
+    def speed_channel(self):
+        return self._speed_channel
+
+
+    @property
+    def speed_decimals(self):
+        return self._speed_decimals
+
+
+    @property
+    def lane_reference(self):
+        return self._lane_reference
+
+
+    @property
+    def layout(self):
+        return self._layout
+
+
+    @property
+    def green_phase(self):
+        return self._green_phase
+
+
+    @property
+    def yellow_phase(self):
+        return self._yellow_phase
+
+
+    @property
+    def red_phase(self):
+        return self._red_phase
+
+
+def read_intersections(content):
+    """
+    Read the [intersection.X] sections of the config file, in the order of the file
+    """
+    intersections = []
+    for section_name in content.sections():
+        if not section_name.startswith('intersection.'):
+            continue
+        section = content[section_name]
+        name = section_name[len('intersection.'):]
+        intersections.append(Intersection(
+            name,
+            _names(section['incoming_roads']),
+            _names(section['traffic_lights']),
+            [float(bound) for bound in _names(section['cell_bounds'])],
+            _weights(section['occupancy']),
+            _weights(section['reward_weights']),
+            _choice(section, 'speed_channel', ('none', 'last', 'mean'), name),
+            section.getint('speed_decimals', fallback=1),
+            section.getboolean('lane_reference', fallback=False),
+            _choice(section, 'layout', ('cells', 'lanes'), name),
+            section.getint('green_phase', fallback=0),
+            section.getint('yellow_phase', fallback=1),
+            section.getint('red_phase', fallback=2)
+        ))
+    return intersections
+
+
+def _choice(section, option, choices, name):
+    """
+    Value of an option that takes one of the given words, the first one by default, stop on any other value
+    """
+    value = section.get(option, choices[0])
+    if value not in choices:
+        sys.exit("unknown " + option + " '" + value + "' in intersection " + name + ", use " + ", ".join(choices))
+    return value
+
+
+def check_types(Intersection, vehicle_types):
+    """
+    Stop when the occupancy or the reward weights of the intersection name a type that is not in the route file
+    """
+    unknown = [car_type for car_type in list(Intersection.occupancy) + list(Intersection.reward_weights) if car_type not in vehicle_types]
+    if unknown:
+        sys.exit("unknown vehicle types " + ", ".join(sorted(set(unknown))) + " in intersection " + Intersection.name + ", use " + ", ".join(vehicle_types))
+
+
+def incoming_roads_of(intersections):
+    """
+    Incoming roads of all the intersections, in the order of their codes in the vehicle table
+    """
+    return [road_id for intersection in intersections for road_id in intersection.incoming_roads]
+
+
+def observes_lanes(intersections):
+    """
+    Whether the lane of the cars is needed to build the states of the intersections
+    """
+    return any(intersection.lane_reference or intersection.layout == 'lanes' for intersection in intersections)
+
+
+def _names(value):
+    """
+    Split a comma separated list of names
+    """
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+def _weights(value):
+    """
+    Split a comma separated list of name: number pairs, keeping their order
+    """
+    weights = {}
+    for pair in _names(value):
+        name, number = pair.split(':')
+        weights[name.strip()] = float(number)
+    return weights
@@ -0,0 +1,112 @@
+import hashlib
+import os
+import pickle
+import xml.etree.ElementTree as ET
+
+import sumolib
+
+# version of the fields of the index, a cache written with another version is rebuilt
+INDEX_VERSION = 3
+
+
+class NetIndex:
+    def __init__(self, lane_lengths, lane_max_speeds, edge_lanes, edge_lengths, edge_junctions, incoming_edges, tls_phases):
+        self._lane_lengths = lane_lengths
+        self._lane_max_speeds = lane_max_speeds
+        self._edge_lanes = edge_lanes
+        self._edge_lengths = edge_lengths
+        self._edge_junctions = edge_junctions
+        self._incoming_edges = incoming_edges
+        self._tls_phases = tls_phases
+
+
+    @property
+    def lane_lengths(self):
+        return self._lane_lengths
+
+
+    @property
+    def lane_max_speeds(self):
+        return self._lane_max_speeds
+
+
+    @property
+    def edge_lanes(self):
+        return self._edge_lanes
+
+
+    @property
+    def edge_lengths(self):
+        return self._edge_lengths
+
+
+    @property
+    def edge_junctions(self):
+        return self._edge_junctions
+
+
+    @property
+    def incoming_edges(self):
+        return self._incoming_edges
+
+
+    @property
+    def tls_phases(self):
+        return self._tls_phases
+
+
+def net_file_of(sumocfg_file):
+    """
+    Retrieve the path of the net file used by the sumo configuration file
+    """
+    net_file = ET.parse(sumocfg_file).find('input/net-file').get('value')
+    return os.path.join(os.path.dirname(sumocfg_file), net_file)
+
+
+def load_net_index(net_file):
+    """
+    Load the index of the net file from its cache, the index is built with sumolib only when the net file has changed since the cache was written
+    """
+    with open(net_file, 'rb') as net:
+        net_hash = hashlib.sha1(net.read()).hexdigest()
+    key = (INDEX_VERSION, net_hash)
+
+    cache_file = net_file + '.index'
+    if os.path.isfile(cache_file):
+        with open(cache_file, 'rb') as cache:
+            cached_key, fields = pickle.load(cache)
+        if cached_key == key:
+            return NetIndex(*fields)
+
+    fields = _build_net_index(net_file)
+    with open(cache_file, 'wb') as cache:
+        pickle.dump((key, fields), cache, protocol=pickle.HIGHEST_PROTOCOL)
+    return NetIndex(*fields)
+
+
+def _build_net_index(net_file):
+    """
+    Read the lanes, edges and traffic lights of the net file
+    """
+    net = sumolib.net.readNet(net_file, withPrograms=True)
+    lane_lengths = {}
+    lane_max_speeds = {}
+    edge_lanes = {}
+    edge_lengths = {}
+    edge_junctions = {}
+    for edge in net.getEdges():
+        edge_lanes[edge.getID()] = tuple(lane.getID() for lane in edge.getLanes())  # from the rightmost lane
+        edge_lengths[edge.getID()] = edge.getLength()
+        edge_junctions[edge.getID()] = edge.getToNode().getID()  # junction at the end of the edge
+        for lane in edge.getLanes():
+            lane_lengths[lane.getID()] = lane.getLength()
+            lane_max_speeds[lane.getID()] = lane.getSpeed()
+
+    incoming_edges = {}
+    tls_phases = {}
+    for tls in net.getTrafficLights():
+        incoming_edges[tls.getID()] = tuple(sorted(edge.getID() for edge in tls.getEdges()))  # edges controlled by the traffic light
+        program = next(iter(tls.getPrograms().values()))  # the nets have a single static program for every traffic light
+        tls_phases[tls.getID()] = tuple(phase.state for phase in program.getPhases())  # light states of the phases, in the order of the program
+
+    return lane_lengths, lane_max_speeds, edge_lanes, edge_lengths, edge_junctions, incoming_edges, tls_phases
@@ -0,0 +1,111 @@
+import traci
+import traci.constants as tc
+
+# vehicle variables retrieved at every step through the subscription, the static ones (type, vClass, max speed) are read from the route file
+VEHICLE_VARIABLES = (
+    tc.VAR_ROAD_ID,
+    tc.VAR_ACCUMULATED_WAITING_TIME,
+    tc.VAR_CO2EMISSION,
+    tc.VAR_NOISEEMISSION,
+    tc.VAR_LANEPOSITION,
+    tc.VAR_SPEED,
+)
+
+# road variables retrieved at every step through the subscription
+ROAD_VARIABLES = (
+    tc.LAST_STEP_VEHICLE_HALTING_NUMBER,
+    tc.LAST_STEP_MEAN_SPEED,
+    tc.LAST_STEP_VEHICLE_ID_LIST,
+)
+
+
+class VehicleSubscription:
+    def __init__(self, roads, variables=VEHICLE_VARIABLES, road_variables=ROAD_VARIABLES, on_roads_only=False):
+        self._roads = roads
+        self._variables = variables
+        self._road_variables = road_variables
+        self._on_roads_only = on_roads_only  # subscribe the cars only while they are on the roads, instead of from their departure to their arrival
+        self._cars = None  # ids of the cars subscribed in this episode, None = every car
+        self._vehicles = {}
+        self._road_values = {}
+        self._subscribed = set()  # cars subscribed while they are on the roads
+        self._departed = ()
+        self._arrived = ()
+
+
+    def start(self, cars=None):
+        """
+        Subscribe to the departures, arrivals and roads of the new simulation, to be called right after sumo is started, only the given cars are subscribed
+        """
+        traci.simulation.subscribe([tc.VAR_DEPARTED_VEHICLES_IDS, tc.VAR_ARRIVED_VEHICLES_IDS])
+        for road_id in self._roads:
+            traci.edge.subscribe(road_id, self._road_variables)
+        self._cars = cars
+        self._vehicles = {}
+        self._road_values = traci.edge.getAllSubscriptionResults()
+        self._subscribed = set()
+        self._departed = ()
+        self._arrived = ()
+
+
+    def update(self):
+        """
+        Subscribe the vehicles departed in the last step, or the ones that entered the roads, then take the snapshot of every subscribed vehicle and road
+        """
+        simulation = traci.simulation.getSubscriptionResults()
+        self._departed = simulation.get(tc.VAR_DEPARTED_VEHICLES_IDS, ())
+        self._arrived = simulation.get(tc.VAR_ARRIVED_VEHICLES_IDS, ())
+        self._road_values = traci.edge.getAllSubscriptionResults()
+        if self._on_roads_only:
+            self._follow_roads()
+        else:
+            for car_id in self._departed:
+                if self._cars is not None and car_id not in self._cars:  # not observed in this episode
+                    continue
+                try:
+                    traci.vehicle.subscribe(car_id, self._variables)
+                except traci.TraCIException:  # with a step of several seconds the car may have already arrived
+                    pass
+        self._vehicles = traci.vehicle.getAllSubscriptionResults()  # the results arrive with the simulation step, vehicles that left the network are dropped by sumo
+        return self._vehicles
+
+
+    def _follow_roads(self):
+        """
+        Subscribe the cars that entered the roads since the last update and unsubscribe the ones that left them, the vehicle lists of the roads arrive with the simulation step
+        """
+        on_roads = set()
+        for values in self._road_values.values():
+            on_roads.update(values[tc.LAST_STEP_VEHICLE_ID_LIST])
+        if self._cars is not None:
+            on_roads &= self._cars
+        for car_id in on_roads - self._subscribed:
+            traci.vehicle.subscribe(car_id, self._variables)  # the answer carries the values of the current step
+        for car_id in self._subscribed - on_roads - set(self._arrived):  # the subscriptions of the arrived cars are dropped by sumo
+            traci.vehicle.unsubscribe(car_id)
+        self._subscribed = on_roads
+
+
+    @property
+    def variables(self):
+        return self._variables
+
+
+    @property
+    def vehicles(self):
+        return self._vehicles
+
+
+    @property
+    def roads(self):
+        return self._road_values
+
+
+    @property
+    def departed(self):
+        return self._departed
+
+
+    @property
+    def arrived(self):
+        return self._arrived
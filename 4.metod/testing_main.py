@@ -4,19 +4,27 @@ from __future__ import print_function
 import os
 from shutil import copyfile
 
-from testing_simulation import Simulation
 from generator import TrafficGenerator
+from netindex import load_net_index, net_file_of
+from encoder import state_size
 from model import TestModel
 from visualization import Visualization
-from utils import import_test_configuration, set_sumo, set_test_path
+from utils import import_test_configuration, set_backend, set_sumo, set_test_path
 
 
 if __name__ == "__main__":
 
     config = import_test_configuration(config_file='testing_settings.ini')
+    set_backend(config['backend'], config['gui'])
+    from testing_simulation import Simulation, VEHICLE_TYPES  # imports traci, so the backend has to be selected first
+    from detectors import DetectorObservation, DETECTOR_FILE
+
     sumo_cmd = set_sumo(config['gui'], config['sumocfg_file_name'], config['max_steps'])
     model_path, plot_path = set_test_path(config['models_path_name'], config['model_to_test'])
 
+    NetIndex = load_net_index(net_file_of(os.path.join('intersection', config['sumocfg_file_name'])))  # lanes, edges and traffic lights of the net, cached on disk
+    config['num_states'] = state_size(config['intersections'][0], NetIndex, VEHICLE_TYPES)  # input of the model, derived from the layout of the state
+
     Model = TestModel(
         input_dim=config['num_states'],
         model_path=model_path
@@ -27,6 +35,12 @@ if __name__ == "__main__":
         config['n_cars_generated']
     )
 
+    Detectors = None
+    if config['observation'] == 'detectors':  # the state is read from lane-area detectors on the cells of the incoming roads
+        Detectors = DetectorObservation(NetIndex, config['intersections'])
+        Detectors.write(DETECTOR_FILE)
+        sumo_cmd += ["--additional-files", DETECTOR_FILE]
+
     Visualization = Visualization(
         plot_path, 
         dpi=96
@@ -35,12 +49,18 @@ if __name__ == "__main__":
     Simulation = Simulation(
         Model,
         TrafficGen,
+        NetIndex,
+        config['intersections'],
         sumo_cmd,
         config['max_steps'],
         config['green_duration'],
         config['yellow_duration'],
         config['num_states'],
-        config['num_actions']
+        config['num_actions'],
+        Detectors,
+        config['observation'] == 'roads',
+        config['sampling_interval'],
+        config['observation_budget']
     )
 
     print('\n----- Test episode')
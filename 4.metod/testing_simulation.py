@@ -1,27 +1,32 @@
 import traci
+import traci.constants as tc
 import numpy as np
 import random
 import timeit
 import os
 
-# phase codes based on environment.net.xml
-PHASE_01_GREEN = 0
-PHASE_01_YELLOW = 1
-PHASE_01_RED = 2
+from metrics import StepMetrics
+from subscription import VehicleSubscription, VEHICLE_VARIABLES
+from tracker import VehicleTracker
+from table import VehicleTable
+from phases import PhaseTable
+from encoder import StateEncoder, VehicleSnapshot, ObservationTimer
+from reward import WaitingReward
+from intersection import incoming_roads_of, observes_lanes
 
-PHASE_02_GREEN = 0
-PHASE_02_YELLOW = 1
-PHASE_02_RED = 2
-
-PHASE_03_GREEN = 0
-PHASE_03_YELLOW = 1
-PHASE_03_RED = 2
+# vehicle types of the route file, in the order of their codes in the vehicle table
+VEHICLE_TYPES = ["standard_car", "bus", "taxi"]
 
 
 class Simulation:
-    def __init__(self, Model, TrafficGen, sumo_cmd, max_steps, green_duration, yellow_duration, num_states, num_actions):
+    def __init__(self, Model, TrafficGen, NetIndex, Intersections, sumo_cmd, max_steps, green_duration, yellow_duration, num_states, num_actions, Detectors=None, road_subscription=False, sampling_interval=1, observation_budget=0.005):
         self._Model = Model
         self._TrafficGen = TrafficGen
+        self._NetIndex = NetIndex
+        self._incoming_roads = incoming_roads_of(Intersections)  # roads of all the intersections, where the statistics of every step are gathered
+        self._Intersection = Intersections[0]  # the intersection controlled by the agent
+        self._Detectors = Detectors  # lane-area detectors of the cells, when the state is read from them
+        self._sampling_interval = sampling_interval  # steps between two samples of the statistics, 1 = every step
         self._step = 0
         self._sumo_cmd = sumo_cmd
         self._max_steps = max_steps
@@ -31,6 +36,15 @@ class Simulation:
         self._num_actions = num_actions
         self._reward_episode = []
         self._queue_length_episode = []
+        self._Subscription = VehicleSubscription(self._incoming_roads, VEHICLE_VARIABLES + ((tc.VAR_LANE_ID,) if observes_lanes(Intersections) else ()), on_roads_only=road_subscription)  # with a road subscription the cars are only read while they are on the incoming roads
+        self._Tracker = VehicleTracker(self._incoming_roads)
+        self._Table = VehicleTable(self._incoming_roads, VEHICLE_TYPES, self._Subscription.variables)
+        self._Phases = PhaseTable(NetIndex, self._Intersection)  # light states of the actions, compiled from the net
+        self._ObservationTimer = ObservationTimer(observation_budget)  # time taken by the observation of every decision
+        self._Snapshot = VehicleSnapshot(NetIndex, self._incoming_roads)  # cars of the incoming roads at the last decision, read by the state encoders
+        self._Encoder = StateEncoder(self._Intersection, NetIndex, self._incoming_roads, VEHICLE_TYPES, detectors=Detectors is not None)  # cells of the state, compiled from the intersection
+        self._Reward = WaitingReward(self._Intersection, self._incoming_roads, VEHICLE_TYPES)  # weights of the waiting times in the reward, compiled from the intersection
+        self._StepMetrics = StepMetrics(self._incoming_roads)
 
 
     def run(self, episode):
@@ -42,22 +56,28 @@ class Simulation:
         # first, generate the route file for this simulation and set up sumo
         self._TrafficGen.generate_routefile(seed=episode)
         traci.start(self._sumo_cmd)
+        self._Subscription.start()
+        self._Tracker.start()
+        self._Table.start(self._TrafficGen.route_file)  # ids, types and max speeds are cached from the route file
+        self._Snapshot.start()
+        self._ObservationTimer.start_episode()
+        self._Phases.start()
+        if self._Detectors is not None:
+            self._Detectors.start()
         print("Simulating...")
 
         # inits
         self._step = 0
-        self._waiting_times = {}
         old_total_wait = 0
         old_action = -1 # dummy init
 
         while self._step < self._max_steps:
 
-            # get current state of the intersection
-            current_state = self._get_state()
+            # get current state of the intersection and the waiting times for the reward, from one snapshot of the vehicles
+            current_state, current_total_wait = self._observe()
 
             # calculate reward of previous action: (change in cumulative waiting time between actions)
             # waiting time = seconds waited by a car since the spawn in the environment, cumulated for every car in incoming lanes
-            current_total_wait = self._collect_waiting_times()
             reward = old_total_wait - current_total_wait
 
             # choose the light phase to activate, based on the current state of the intersection
@@ -79,6 +99,7 @@ class Simulation:
             self._reward_episode.append(reward)
 
         #print("Total reward:", np.sum(self._reward_episode))
+        print(self._ObservationTimer.end_episode())
         traci.close()
         simulation_time = round(timeit.default_timer() - start_time, 1)
 
@@ -93,39 +114,22 @@ class Simulation:
             steps_todo = self._max_steps - self._step
 
         while steps_todo > 0:
-            traci.simulationStep()  # simulate 1 step in sumo
-            self._step += 1 # update the step counter
-            steps_todo -= 1
-            queue_length = self._get_queue_length() 
-            self._queue_length_episode.append(queue_length)
+            sampled_steps = min(self._sampling_interval, steps_todo)  # steps represented by the sample taken at the end of this chunk
+            traci.simulationStep(float(self._step + sampled_steps))  # simulate the steps of the chunk in sumo with a single call (a float target time, traci warns on ints from 1000 on)
+            self._Subscription.update()  # snapshot of the vehicles, read by every collector of this step
+            self._Tracker.update(self._Subscription.arrived, self._Subscription.roads)
+            self._Table.update(self._Subscription.vehicles, self._Tracker.incoming_cars)
+            self._step += sampled_steps # update the step counter
+            steps_todo -= sampled_steps
+            self._StepMetrics.collect(self._Table, self._Subscription.roads)
+            self._queue_length_episode.extend([self._StepMetrics.queue_length] * sampled_steps)
 
 
     def _collect_waiting_times(self):
         """
         Retrieve the waiting time of every car in the incoming roads
         """
-        incoming_roads = ["E2", "E3", "E4"]
-        car_list = traci.vehicle.getIDList()
-        for car_id in car_list:
-            car_type = traci.vehicle.getTypeID(car_id)
-            if car_type == "bus":
-                wait_time = traci.vehicle.getAccumulatedWaitingTime(car_id)
-                road_id = traci.vehicle.getRoadID(car_id)  # get the road id where the car is located
-                if road_id in incoming_roads:  # consider only the waiting times of cars in incoming roads
-                    self._waiting_times[car_id] = wait_time * 2
-                else:
-                    if car_id in self._waiting_times: # a car that was tracked has cleared the intersection
-                        del self._waiting_times[car_id]
-            elif car_type == "taxi":
-                wait_time = traci.vehicle.getAccumulatedWaitingTime(car_id)
-                road_id = traci.vehicle.getRoadID(car_id)
-                if road_id in incoming_roads:
-                    self._waiting_times[car_id] = wait_time * 1
-                else:
-                    if car_id in self._waiting_times:
-                        del self._waiting_times[car_id]
-        total_waiting_time_for_reward = sum(self._waiting_times.values())
-        return total_waiting_time_for_reward
+        return self._Reward.collect(self._Table)  # waiting time of every type of car, weighted
 
 
     def _choose_action(self, state):
@@ -139,133 +143,49 @@ class Simulation:
         """
         Activate the correct yellow light combination in sumo
         """
-        yellow_phase_code = old_action * 0 + 1 # obtain the yellow phase code, based on the old action (ref on environment.net.xml)
-        if old_action == 0:
-            traci.trafficlight.setPhase("tl_01", yellow_phase_code)
-#            if action_number == 1:
-#                traci.trafficlight.setPhase("tl_02", yellow_phase_code)
-#            elif action_number == 2:
-#                traci.trafficlight.setPhase("tl_03", yellow_phase_code)
-        elif old_action == 1:
-            traci.trafficlight.setPhase("tl_02", yellow_phase_code)
-#            if action_number == 0:
-#                traci.trafficlight.setPhase("tl_01", yellow_phase_code)
-#            elif action_number == 2:
-#                traci.trafficlight.setPhase("tl_03", yellow_phase_code)
-        elif old_action == 2:
-            traci.trafficlight.setPhase("tl_03", yellow_phase_code)
-#            if action_number == 0:
-#                traci.trafficlight.setPhase("tl_01", yellow_phase_code)
-#            elif action_number == 1:
-#                traci.trafficlight.setPhase("tl_02", yellow_phase_code)
+        self._Phases.set_yellow(old_action)
 
 
     def _set_green_phase(self, action_number):
         """
         Activate the correct green light combination in sumo
         """
+        self._Phases.set_green(action_number)
 
 
-        if action_number == 0:
-            traci.trafficlight.setPhase("tl_01", PHASE_01_GREEN)
-            traci.trafficlight.setPhase("tl_02", PHASE_02_RED)
-            traci.trafficlight.setPhase("tl_03", PHASE_02_RED)
-        elif action_number == 1:
-            traci.trafficlight.setPhase("tl_01", PHASE_01_RED)
-            traci.trafficlight.setPhase("tl_02", PHASE_02_GREEN)
-            traci.trafficlight.setPhase("tl_03", PHASE_03_RED)
-        elif action_number == 2:
-            traci.trafficlight.setPhase("tl_01", PHASE_01_RED)
-            traci.trafficlight.setPhase("tl_02", PHASE_02_RED)
-            traci.trafficlight.setPhase("tl_03", PHASE_03_GREEN)
+    def _observe(self):
+        """
+        Read the vehicles once, then build the state and the waiting time for the reward of the intersection from them
+        """
+        start_time = timeit.default_timer()
+        if self._Detectors is not None:
+            self._Detectors.update()
+        self._Snapshot.take(self._Table)
+        observation = self._get_state(), self._collect_waiting_times()
+        self._ObservationTimer.record(timeit.default_timer() - start_time)
+        return observation
 
 
-    def _get_queue_length(self):
+    def _get_detector_state(self):
         """
-        Retrieve the number of cars with speed = 0 in every incoming lane
+        Retrieve the state of the intersection from the lane-area detectors, in the form of cell occupancy
         """
-        halt_dogu = traci.edge.getLastStepHaltingNumber("E2")
-        halt_kuzey = traci.edge.getLastStepHaltingNumber("E3")
-        halt_batı = traci.edge.getLastStepHaltingNumber("E4")
-        queue_length = halt_dogu + halt_kuzey + halt_batı
-        return queue_length
+        cells = self._Detectors.cells(0)  # cells of the intersection among the cells of all the intersections
+        state = np.zeros(self._num_states)
+        state[0:self._Encoder.num_cells] = self._Detectors.occupancy[cells]  # share of the cell covered by cars
+        if self._Intersection.speed_channel != 'none':
+            state[self._Encoder.num_cells:2 * self._Encoder.num_cells] = self._Detectors.speed[cells]  # mean speed of the cars of the cell, relative to the max speed of the lane
+        return state
 
 
     def _get_state(self):
         """
         Retrieve the state of the intersection from sumo, in the form of cell occupancy
         """
-        state = np.zeros(self._num_states)
-       
-        car_list = traci.vehicle.getIDList()
-
-        for car_id in car_list:
-            
-            car_type = traci.vehicle.getTypeID(car_id)
-            
-            if (car_type == "bus") or (car_type == "taxi"):
-                lane_pos = traci.vehicle.getLanePosition(car_id)
-                road_id = traci.vehicle.getRoadID(car_id)
-                lane_pos = 300 - lane_pos  # inversion of lane pos, so if the car is close to the traffic light -> lane_pos = 0 --- 300 = max len of a road
-
-                # distance in meters from the traffic light -> mapping into cells
-                if lane_pos < 5:
-                    lane_cell = 0
-                elif lane_pos < 10:
-                    lane_cell = 1
-                elif lane_pos < 15:
-                    lane_cell = 2
-                elif lane_pos < 20:
-                    lane_cell = 3
-                elif lane_pos < 30:
-                    lane_cell = 4
-                elif lane_pos < 50:
-                    lane_cell = 5
-                elif lane_pos < 100:
-                    lane_cell = 6
-                elif lane_pos < 150:
-                    lane_cell = 7
-                elif lane_pos < 200:
-                    lane_cell = 8
-                elif lane_pos <= 300:
-                    lane_cell = 9
-
-                # finding the road where the car is located 
-            
-                if road_id == "E2":
-                    road_group = 0
-                elif road_id == "E3":
-                    road_group = 1
-                elif road_id == "E4":
-                    road_group = 2
-                else:
-                    road_group = -1
-
-                if road_group >= 1 and road_group <= 2:
-                    car_position = int(str(road_group) + str(lane_cell))  # composition of the two postion ID to create a number in interval 0-29
-                    valid_car = True
-                elif road_group == 0:
-                    car_position = lane_cell
-                    valid_car = True
-                else:
-                    valid_car = False  # flag for not detecting cars crossing the intersection or driving away from it
-
-                if valid_car:
-                    #car_speed = float(traci.vehicle.getSpeed(car_id) / traci.vehicle.getMaxSpeed(car_id))
-                    #a = str(car_speed)
-                    #x = len(a.split(".")[0]) + 1
-                    #y = 1
-                    #z = x + y
-                    if car_type == "bus":
-                        state[car_position] = 2  # write the position of the car car_id in the state array in the form of "cell occupied"
-                    elif car_type == "taxi":
-                        state[car_position] = 1
-                    #state[car_position] = a[0:z]
-                    
-#            else:
-#                pass
+        if self._Detectors is not None:
+            return self._get_detector_state()
 
-        return state
+        return self._Encoder.observe(self._Snapshot)
 
 
     @property
@@ -5,20 +5,33 @@ import os
 import datetime
 from shutil import copyfile
 
-from training_simulation import Simulation
 from generator import TrafficGenerator
+from netindex import load_net_index, net_file_of
+from encoder import state_size
 from memory import Memory
 from model import TrainModel
 from visualization import Visualization
-from utils import import_train_configuration, set_sumo, set_train_path
+from utils import import_train_configuration, set_backend, set_sumo, set_train_path
 
 
 if __name__ == "__main__":
 
     config = import_train_configuration(config_file='training_settings.ini')
+    set_backend(config['backend'], config['gui'])
+    from training_simulation import Simulation, VEHICLE_TYPES  # imports traci, so the backend has to be selected first
+    from detectors import DetectorObservation, DETECTOR_FILE
+    from profiler import TraciProfiler
+
+    Profiler = None
+    if config['profile_traci']:  # calls, latency and bytes of every traci function, nothing is wrapped when disabled
+        Profiler = TraciProfiler()
+
     sumo_cmd = set_sumo(config['gui'], config['sumocfg_file_name'], config['max_steps'])
     path = set_train_path(config['models_path_name'])
 
+    NetIndex = load_net_index(net_file_of(os.path.join('intersection', config['sumocfg_file_name'])))  # lanes, edges and traffic lights of the net, cached on disk
+    config['num_states'] = state_size(config['intersections'][0], NetIndex, VEHICLE_TYPES)  # input of the model, derived from the layout of the state
+
     Model = TrainModel(
         config['num_layers'], 
         config['width_layers'],
@@ -39,6 +52,16 @@ if __name__ == "__main__":
         config['n_cars_generated']
     )
 
+    additional_files = []
+    Detectors = None
+    if config['observation'] == 'detectors':  # the state is read from lane-area detectors on the cells of the incoming roads
+        Detectors = DetectorObservation(NetIndex, config['intersections'])
+        Detectors.write(DETECTOR_FILE)
+        additional_files.append(DETECTOR_FILE)
+
+    if additional_files:
+        sumo_cmd += ["--additional-files", ",".join(additional_files)]
+
     Visualization = Visualization(
         path, 
         dpi=96
@@ -48,6 +71,8 @@ if __name__ == "__main__":
         Model,
         Memory,
         TrafficGen,
+        NetIndex,
+        config['intersections'],
         sumo_cmd,
         config['gamma'],
         config['max_steps'],
@@ -55,7 +80,16 @@ if __name__ == "__main__":
         config['yellow_duration'],
         config['num_states'],
         config['num_actions'],
-        config['training_epochs']
+        config['training_epochs'],
+        config['persistent_connection'],
+        Detectors,
+        config['observation'] == 'roads',
+        config['observed_classes'],
+        config['observed_types'],
+        config['sampling_interval'],
+        config['metrics_level'],
+        config['full_metrics_every'],
+        config['observation_budget']
     )
     
     episode = 0
@@ -64,10 +98,14 @@ if __name__ == "__main__":
     while episode < config['total_episodes']:
         print('\n----- Episode', str(episode+1), 'of', str(config['total_episodes']))
         epsilon = 1.0 - (episode / config['total_episodes'])  # set the epsilon for this episode according to epsilon-greedy policy
+        if Profiler is not None:
+            Profiler.start_episode(episode)
         simulation_time, training_time = Simulation.run(episode, epsilon)  # run the simulation
-        print('Simulation time:', simulation_time, 's - Training time:', training_time, 's - Total:', round(simulation_time+training_time, 1), 's')
+        print('Simulation time:', simulation_time, 's (startup:', Simulation.startup_time, 's) - Training time:', training_time, 's - Total:', round(simulation_time+training_time, 1), 's')
         episode += 1
 
+    Simulation.close()
+
     print("\n----- Start time:", timestamp_start)
     print("----- End time:", datetime.datetime.now())
     print("----- Session info saved at:", path)
@@ -76,10 +114,14 @@ if __name__ == "__main__":
 
     copyfile(src='training_settings.ini', dst=os.path.join(path, 'training_settings.ini'))
 
-    Visualization.save_data_and_plot(data=Simulation.reward_store, filename='reward', xlabel='Episode', ylabel='Cumulative negative reward')
-    Visualization.save_data_and_plot(data=Simulation.cumulative_wait_store_all, filename='delay_all', xlabel='Episode', ylabel='Cumulative delay of all (s)')
-    Visualization.save_data_and_plot(data=Simulation.cumulative_wait_store_bus_and_taxi, filename='delay_bus_and_taxi', xlabel='Episode', ylabel='Cumulative delay of bus and taxi (s)')
-    Visualization.save_data_and_plot(data=Simulation.avg_queue_length_store, filename='queue', xlabel='Episode', ylabel='Average queue length (vehicles)')
-    Visualization.save_data_and_plot(data=Simulation._co2_emission_store, filename ='CO2', xlabel='Episode', ylabel='CO2 emission')
-    Visualization.save_data_and_plot(data=Simulation.mean_speed_store, filename ='mean_speed', xlabel='Episode', ylabel='Average mean speed (m/s)')
-    Visualization.save_data_and_plot(data=Simulation.noise_emission_store, filename ='noise_emission', xlabel='Episode', ylabel='Noise emission (db)')
\ No newline at end of file
+    if Profiler is not None:
+        Profiler.save(path)
+
+    Visualization.save_data_and_plot(data=Simulation.reward_store, filename='reward', xlabel='Episode', ylabel='Cumulative negative reward', episodes=Simulation.reward_episodes)
+    Visualization.save_data_and_plot(data=Simulation.cumulative_wait_store_all, filename='delay_all', xlabel='Episode', ylabel='Cumulative delay of all (s)', episodes=Simulation.metrics_episodes)
+    Visualization.save_data_and_plot(data=Simulation.cumulative_wait_store_bus_and_taxi, filename='delay_bus_and_taxi', xlabel='Episode', ylabel='Cumulative delay of bus and taxi (s)', episodes=Simulation.metrics_episodes)
+    Visualization.save_data_and_plot(data=Simulation.avg_queue_length_store, filename='queue', xlabel='Episode', ylabel='Average queue length (vehicles)', episodes=Simulation.metrics_episodes)
+    Visualization.save_data_and_plot(data=Simulation._co2_emission_store, filename ='CO2', xlabel='Episode', ylabel='CO2 emission', episodes=Simulation.metrics_episodes)
+    Visualization.save_data_and_plot(data=Simulation.mean_speed_store, filename ='mean_speed', xlabel='Episode', ylabel='Average mean speed (m/s)', episodes=Simulation.metrics_episodes)
+    Visualization.save_data_and_plot(data=Simulation.noise_emission_store, filename ='noise_emission', xlabel='Episode', ylabel='Noise emission (db)', episodes=Simulation.metrics_episodes)
+    Visualization.save_data_and_plot(data=Simulation.observation_time_store, filename='observation_time', xlabel='Episode', ylabel='Slowest observation of a decision (ms)')
\ No newline at end of file
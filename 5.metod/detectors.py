@@ -0,0 +1,101 @@
+import traci
+import traci.constants as tc
+import numpy as np
+
+# additional file with the lane-area detectors, written next to the sumo configuration
+DETECTOR_FILE = "intersection/detectors.add.xml"
+
+# detector variables retrieved at every step through the subscription
+DETECTOR_VARIABLES = (
+    tc.LAST_STEP_OCCUPANCY,
+    tc.LAST_STEP_VEHICLE_HALTING_NUMBER,
+    tc.LAST_STEP_MEAN_SPEED,
+    tc.LAST_STEP_VEHICLE_NUMBER,
+)
+
+
+class DetectorObservation:
+    def __init__(self, NetIndex, Intersections):
+        self._detectors = []
+        self._cell_slices = []  # cells of every intersection, the cells of the intersections follow each other
+        n_cells = 0
+        for Intersection in Intersections:
+            cells_per_road = len(Intersection.cell_bounds) + 1
+            first_cell = n_cells
+            for road_id in Intersection.incoming_roads:
+                for lane_id in NetIndex.edge_lanes[road_id]:
+                    lane_length = NetIndex.lane_lengths[lane_id]
+                    ends = [0] + [min(bound, lane_length) for bound in Intersection.cell_bounds] + [lane_length]  # the last cell goes up to the start of the lane
+                    for lane_cell in range(cells_per_road):
+                        if ends[lane_cell + 1] > ends[lane_cell]:  # a cell beyond the start of a short lane has no detector
+                            detector_id = "e2_" + lane_id + "_" + str(lane_cell)
+                            self._detectors.append((detector_id, lane_id, lane_length - ends[lane_cell + 1], ends[lane_cell + 1] - ends[lane_cell], n_cells + lane_cell))
+                n_cells += cells_per_road
+            self._cell_slices.append(slice(first_cell, n_cells))
+
+        self._detector_cells = np.array([detector[4] for detector in self._detectors], dtype=np.intp)  # cell of every detector
+        self._lane_max_speeds = np.array([NetIndex.lane_max_speeds[detector[1]] for detector in self._detectors])
+        self._lanes_per_cell = np.maximum(np.bincount(self._detector_cells, minlength=n_cells), 1)
+        self._occupancy = np.zeros(len(self._lanes_per_cell))
+        self._halting = np.zeros(len(self._lanes_per_cell))
+        self._speed = np.zeros(len(self._lanes_per_cell))
+
+
+    def write(self, detector_file=DETECTOR_FILE):
+        """
+        Write the additional file with a lane-area detector for every cell of every lane of the roads
+        """
+        with open(detector_file, "w") as additional:
+            print("<additional>", file=additional)
+            for detector_id, lane_id, pos, length, _ in self._detectors:
+                print('    <laneAreaDetector id="%s" lane="%s" pos="%s" length="%s" freq="86400" file="NUL" friendlyPos="true"/>' % (detector_id, lane_id, pos, length), file=additional)
+            print("</additional>", file=additional)
+
+
+    def start(self):
+        """
+        Subscribe to the detectors of the new simulation, to be called right after sumo is started
+        """
+        for detector in self._detectors:
+            traci.lanearea.subscribe(detector[0], DETECTOR_VARIABLES)
+        self._occupancy.fill(0)
+        self._halting.fill(0)
+        self._speed.fill(0)
+
+
+    def update(self):
+        """
+        Read the detectors of the last step and merge the lanes of every cell
+        """
+        results = traci.lanearea.getAllSubscriptionResults()
+        values = np.array([[results[detector[0]][variable] for variable in DETECTOR_VARIABLES] for detector in self._detectors])
+        n_cells = len(self._lanes_per_cell)
+        n_vehicles = values[:, 3]
+        occupancy = np.bincount(self._detector_cells, weights=values[:, 0], minlength=n_cells)
+        self._occupancy = occupancy / (self._lanes_per_cell * 100)  # mean occupancy of the lanes of the cell, from percent to 0-1
+        self._halting = np.bincount(self._detector_cells, weights=values[:, 1], minlength=n_cells)
+        speed = np.bincount(self._detector_cells, weights=np.minimum(values[:, 2] / self._lane_max_speeds, 1) * n_vehicles, minlength=n_cells)  # the mean speed of an empty detector is -1, weighted by 0 vehicles
+        vehicles = np.bincount(self._detector_cells, weights=n_vehicles, minlength=n_cells)
+        self._speed = np.divide(speed, vehicles, out=np.zeros(n_cells), where=vehicles > 0)  # mean speed of the cars of the cell, relative to the max speed of the lane
+
+
+    def cells(self, intersection):
+        """
+        Slice of the cells of the n-th intersection in the arrays of the detectors
+        """
+        return self._cell_slices[intersection]
+
+
+    @property
+    def occupancy(self):
+        return self._occupancy
+
+
+    @property
+    def halting(self):
+        return self._halting
+
+
+    @property
+    def speed(self):
+        return self._speed
@@ -0,0 +1,283 @@
+import numpy as np
+
+from intersection import check_types
+
+# speed in m/s below which sumo counts a car as halting
+HALTING_SPEED = 0.1
+
+
+def state_size(Intersection, NetIndex, vehicle_types):
+    """
+    Number of values in the state of the intersection, the input of its model
+    """
+    check_types(Intersection, vehicle_types)
+    cells_per_road = len(Intersection.cell_bounds) + 1
+    if Intersection.layout == 'lanes':  # count, presence of every observed type, mean speed and halting cars of every cell of every lane
+        n_lanes = sum(len(NetIndex.edge_lanes[road_id]) for road_id in Intersection.incoming_roads)
+        return n_lanes * cells_per_road * (len(Intersection.occupancy) + 3)
+    n_cells = len(Intersection.incoming_roads) * cells_per_road
+    return n_cells if Intersection.speed_channel == 'none' else 2 * n_cells
+
+
+class VehicleSnapshot:
+    def __init__(self, NetIndex, incoming_roads):
+        self._NetIndex = NetIndex
+        self._lane_position_of = {lane_id: position for road_id in incoming_roads for position, lane_id in enumerate(NetIndex.edge_lanes[road_id])}  # lane -> position of the lane in its road
+        self._road_lengths = np.array([NetIndex.edge_lengths[road_id] for road_id in incoming_roads])  # length of the incoming roads, by road code
+        self.start()
+
+
+    def start(self):
+        """
+        Forget the lanes of the previous simulation, to be called right after the vehicle table is started
+        """
+        self._lane_lengths = np.zeros(0)  # length of the lanes, by lane code of the vehicle table
+        self._lane_max_speeds = np.zeros(0)
+        self._lane_positions = np.zeros(0, dtype=np.intp)
+        self._road_codes = np.zeros(0, dtype=np.int8)  # the cars in the incoming roads at the last snapshot
+        self._types = np.zeros(0, dtype=np.int8)
+        self._positions = np.zeros(0)
+        self._speeds = np.zeros(0)
+        self._max_speeds = np.zeros(0)
+        self._lanes = None
+
+
+    def take(self, table):
+        """
+        Copy the cars in the incoming roads out of the vehicle table, once for the encoders of all the intersections
+        """
+        slots = np.flatnonzero(table.roads >= 0)
+        lanes = table.lanes[slots] if table.lanes is not None else None
+        if lanes is not None and len(self._lane_lengths) < len(table.lane_ids):  # lanes met for the first time since the last snapshot
+            new_lanes = table.lane_ids[len(self._lane_lengths):]
+            self._lane_lengths = np.concatenate((self._lane_lengths, [self._NetIndex.lane_lengths[lane_id] for lane_id in new_lanes]))
+            self._lane_max_speeds = np.concatenate((self._lane_max_speeds, [self._NetIndex.lane_max_speeds[lane_id] for lane_id in new_lanes]))
+            self._lane_positions = np.concatenate((self._lane_positions, [self._lane_position_of[lane_id] for lane_id in new_lanes])).astype(np.intp)
+        self._road_codes = table.roads[slots]
+        self._types = table.types[slots]
+        self._positions = table.positions[slots]
+        self._speeds = table.speeds[slots]
+        self._max_speeds = table.max_speeds[slots]
+        self._lanes = lanes
+
+
+    def road_distances(self, cars):
+        """
+        Distance of the given cars from the traffic light, measured from the length of their road
+        """
+        return self._road_lengths[self._road_codes[cars]] - self._positions[cars]  # inversion of lane pos, so if the car is close to the traffic light -> distance = 0
+
+
+    def lane_distances(self, cars):
+        """
+        Distance of the given cars from the traffic light, measured from the length of their lane
+        """
+        return self._lane_lengths[self._lanes[cars]] - self._positions[cars]
+
+
+    def car_speed_ratios(self, cars):
+        """
+        Speed of the given cars relative to their own max speed
+        """
+        return self._speeds[cars] / self._max_speeds[cars]
+
+
+    def lane_speed_ratios(self, cars):
+        """
+        Speed of the given cars relative to the max speed of their lane
+        """
+        return self._speeds[cars] / self._lane_max_speeds[self._lanes[cars]]
+
+
+    def lane_positions(self, cars):
+        """
+        Position of the lane of the given cars in their road, 0 = rightmost lane
+        """
+        return self._lane_positions[self._lanes[cars]]
+
+
+    def halted(self, cars):
+        """
+        Whether the given cars are halting
+        """
+        return self._speeds[cars] < HALTING_SPEED
+
+
+    @property
+    def road_codes(self):
+        return self._road_codes
+
+
+    @property
+    def types(self):
+        return self._types
+
+
+class StateEncoder:
+    def __init__(self, Intersection, NetIndex, incoming_roads, vehicle_types, detectors=False):
+        road_codes = [list(incoming_roads).index(road_id) for road_id in Intersection.incoming_roads]
+        self._layout = Intersection.layout  # cells (one value for every cell of every road) or lanes (channels for every cell of every lane)
+        self._cell_bounds = np.asarray(Intersection.cell_bounds, dtype=float)
+        self._cells_per_road = len(self._cell_bounds) + 1
+        self._group_of = np.zeros(len(incoming_roads), dtype=np.intp)  # road code -> position of the road in the state, or of its first lane with the lanes layout
+        if self._layout == 'lanes':
+            lanes_per_road = [len(NetIndex.edge_lanes[road_id]) for road_id in Intersection.incoming_roads]
+            self._group_of[road_codes] = np.cumsum([0] + lanes_per_road[:-1])
+            self._n_cells = sum(lanes_per_road) * self._cells_per_road  # cells of all the lanes, lane after lane
+        else:
+            self._group_of[road_codes] = np.arange(len(road_codes))
+            self._n_cells = len(road_codes) * self._cells_per_road  # cells of all the roads, road after road
+        self._n_states = state_size(Intersection, NetIndex, vehicle_types)  # stops on a type of the intersection that is not in vehicle_types
+        self._observed_roads = np.zeros(len(incoming_roads), dtype=bool)  # road code -> road of the intersection
+        self._observed_roads[road_codes] = True
+        self._observed_types = np.array([car_type in Intersection.occupancy for car_type in vehicle_types] + [False])  # type code -> observed type, the unknown type -1 reads the last entry
+        self._type_values = np.array([Intersection.occupancy.get(car_type, 0) for car_type in vehicle_types], dtype=float)  # value written in the cell, by type code
+        self._presence_codes = [vehicle_types.index(car_type) for car_type in Intersection.occupancy]  # type codes of the presence channels of the lanes layout
+        self._speed_channel = Intersection.speed_channel  # none, last (speed of the last car of the cell) or mean (mean speed of the cars of the cell)
+        self._speed_scale = 10 ** Intersection.speed_decimals
+        self._lane_reference = Intersection.lane_reference
+        self._detectors = detectors  # the states are read from the lane-area detectors: occupancy shares and mean speed ratios of the cells
+
+
+    def observe(self, snapshot):
+        """
+        Build the state from the cars of the observed types in the roads of the intersection, read from the shared vehicle snapshot
+        """
+        cars = np.flatnonzero(self._observed_roads[snapshot.road_codes] & self._observed_types[snapshot.types])
+        if self._lane_reference:  # the length and the max speed of the lane come from the net index
+            distances = snapshot.lane_distances(cars)
+            speed_ratios = snapshot.lane_speed_ratios(cars)
+        else:
+            distances = snapshot.road_distances(cars)
+            speed_ratios = snapshot.car_speed_ratios(cars)
+        if self._layout == 'lanes':
+            return self.encode_lanes(snapshot.road_codes[cars], snapshot.lane_positions(cars), distances, snapshot.types[cars], speed_ratios, snapshot.halted(cars))
+        return self.encode(snapshot.road_codes[cars], distances, snapshot.types[cars], speed_ratios)
+
+
+    def encode(self, road_codes, distances, types, speed_ratios):
+        """
+        Build the state from the arrays of the cars in the roads of the encoder: road code, distance from the traffic light, type code and speed relative to the max speed
+        """
+        state = np.zeros(self.num_states)
+        if len(road_codes) == 0:
+            return state
+        cells = self._group_of[road_codes] * self._cells_per_road + np.searchsorted(self._cell_bounds, distances, side='right')  # distance in meters from the traffic light -> cell of the road
+
+        last = len(cells) - 1 - np.unique(cells[::-1], return_index=True)[1]  # the last car of every cell, it overwrites the cars before it
+        state[cells[last]] = self._type_values[types[last]]  # cell occupied
+
+        if self._speed_channel == 'last':
+            state[self._n_cells + cells[last]] = self.quantize(speed_ratios[last])  # speed of the last car of the cell
+        elif self._speed_channel == 'mean':
+            counts = np.bincount(cells, minlength=self._n_cells)
+            speeds = np.bincount(cells, weights=np.minimum(speed_ratios, 1), minlength=self._n_cells)
+            state[self._n_cells:] = np.divide(speeds, counts, out=np.zeros(self._n_cells), where=counts > 0)  # mean speed of the cars of the cell
+        return state
+
+
+    def encode_lanes(self, road_codes, lane_positions, distances, types, speed_ratios, halted):
+        """
+        Build the channels of every cell of every lane in one pass over the cars: number of cars, presence of every observed type, mean speed relative to the max speed and halting cars
+        """
+        state = np.zeros(self.num_states)
+        if len(road_codes) == 0:
+            return state
+        cells = (self._group_of[road_codes] + lane_positions) * self._cells_per_road + np.searchsorted(self._cell_bounds, distances, side='right')
+
+        counts = np.bincount(cells, minlength=self._n_cells)
+        channels = [counts]
+        for code in self._presence_codes:
+            channels.append(np.bincount(cells, weights=types == code, minlength=self._n_cells) > 0)
+        speeds = np.bincount(cells, weights=np.minimum(speed_ratios, 1), minlength=self._n_cells)
+        channels.append(np.divide(speeds, counts, out=np.zeros(self._n_cells), where=counts > 0))
+        channels.append(np.bincount(cells, weights=halted, minlength=self._n_cells))
+        state[:] = np.concatenate(channels)  # channel after channel, the cells of a channel lane after lane
+        return state
+
+
+    def quantize(self, speed_ratios):
+        """
+        Cut the speed ratios to the configured decimals, the same value as cutting their decimal string
+        """
+        steps = np.floor(speed_ratios * self._speed_scale)
+        steps -= steps / self._speed_scale > speed_ratios  # the product rounded up to the next step, e.g. 0.6999999999999999 * 10 = 7.0
+        steps += (steps + 1) / self._speed_scale <= speed_ratios  # the product rounded down below the step
+        return steps / self._speed_scale
+
+
+    def state_key(self, state):
+        """
+        Compact bytes of a state of the encoder, equal for equal states so they can be hashed: the occupancy of the cells packed in 2 bits (values 0-3) and the speeds cut to bytes
+        """
+        if self._detectors:  # shares and speed ratios between 0 and 1, cut to bytes instead of rounded to the type values
+            return np.rint(np.clip(state, 0, 1) * 255).astype(np.uint8).tobytes()
+
+        if self._layout == 'lanes':
+            channels = state.reshape(-1, self._n_cells)
+            counts = np.minimum(channels[0], 255).astype(np.uint8)
+            presence = np.packbits(channels[1:-2] > 0)
+            speeds = np.rint(channels[-2] * 255).astype(np.uint8)  # mean speed ratio, at most 1
+            halted = np.minimum(channels[-1], 255).astype(np.uint8)
+            return counts.tobytes() + presence.tobytes() + speeds.tobytes() + halted.tobytes()
+
+        codes = np.zeros(-(-self._n_cells // 4) * 4, dtype=np.uint8)  # four cells in every byte
+        codes[:self._n_cells] = np.clip(np.rint(state[:self._n_cells]), 0, 3)
+        codes = codes.reshape(-1, 4)
+        key = (codes[:, 0] << 6 | codes[:, 1] << 4 | codes[:, 2] << 2 | codes[:, 3]).tobytes()
+        if self._speed_channel == 'last':  # the speeds are already cut to the decimals, one step = one unit
+            key += np.rint(state[self._n_cells:] * self._speed_scale).astype(np.uint8 if self._speed_scale <= 100 else np.uint16).tobytes()
+        elif self._speed_channel == 'mean':
+            key += np.rint(state[self._n_cells:] * 255).astype(np.uint8).tobytes()  # mean speed ratio, at most 1
+        return key
+
+
+    @property
+    def num_cells(self):
+        return self._n_cells
+
+
+    @property
+    def num_states(self):
+        return self._n_states
+
+
+class ObservationTimer:
+    def __init__(self, budget):
+        self._budget = budget  # seconds allowed to the observation of one decision
+        self._times = []  # seconds of every observation of the current episode
+        self._max_time_store = []
+
+
+    def start_episode(self):
+        """
+        Forget the times of the previous episode
+        """
+        self._times = []
+
+
+    def record(self, seconds):
+        """
+        Add the time taken by the observation of a decision
+        """
+        self._times.append(seconds)
+
+
+    def end_episode(self):
+        """
+        Save the slowest observation of the episode and return the report of its observation times
+        """
+        times = np.array(self._times) * 1000  # from s to ms
+        max_time = times.max() if len(times) else 0
+        self._max_time_store.append(max_time)
+        return "Observation time: mean %.3f ms, max %.3f ms - %d of %d decisions over the budget of %.1f ms" % (times.mean() if len(times) else 0, max_time, np.count_nonzero(times > self._budget * 1000), len(times), self._budget * 1000)
+
+
+    @property
+    def budget(self):
+        return self._budget
+
+
+    @property
+    def max_time_store(self):
+        return self._max_time_store
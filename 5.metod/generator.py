@@ -5,6 +5,7 @@ class TrafficGenerator:
     def __init__(self, max_steps, n_cars_generated):
         self._n_cars_generated = n_cars_generated  # how many cars per episode
         self._max_steps = max_steps
+        self._route_file = "intersection/sehrekustu.rou.xml"
 
     def generate_routefile(self, seed):
         """
@@ -28,7 +29,7 @@ class TrafficGenerator:
         car_gen_steps = np.rint(car_gen_steps)  # round every value to int -> effective steps when a car will be generated
 
         # produce the file for cars generation, one car per line
-        with open("intersection/sehrekustu.rou.xml", "w") as routes:
+        with open(self._route_file, "w") as routes:
             print("""<routes>
             <vType accel="1.0" decel="4.5" vClass= "passenger" id="standart_car" length="5.0" minGap="2.5" maxSpeed="25" sigma="0.5" color= "cyan" />
             <vType accel="1.0" decel="4.5" vClass= "bus" id="bus" length="10.0" minGap="2.5" maxSpeed="15" sigma="0.5" color= "red" />
@@ -90,3 +91,7 @@ class TrafficGenerator:
                             print('    <vehicle id="taxi_B_K_%i" type="taxi" route="B_K" depart="%s" departLane="random" departSpeed="8" />' % (car_counter, step), file=routes)
 
             print("</routes>", file=routes)
+
+    @property
+    def route_file(self):
+        return self._route_file
@@ -0,0 +1,47 @@
+import traci
+
+
+class PhaseTable:
+    def __init__(self, NetIndex, Intersection):
+        self._traffic_lights = Intersection.traffic_lights  # action n gives the green to the n-th traffic light, the others are red
+        self._green_states = []
+        self._yellow_states = []
+        for action, green_tls in enumerate(self._traffic_lights):
+            green = {}
+            for tls in self._traffic_lights:
+                phases = NetIndex.tls_phases[tls]
+                green[tls] = phases[Intersection.green_phase] if tls == green_tls else phases[Intersection.red_phase]
+            self._green_states.append(green)
+            self._yellow_states.append({green_tls: NetIndex.tls_phases[green_tls][Intersection.yellow_phase]})  # only the light leaving the green turns yellow
+        self._current = {}
+
+
+    def start(self):
+        """
+        Forget the states sent to the previous simulation, to be called right after sumo is started
+        """
+        self._current = {}
+
+
+    def set_green(self, action):
+        """
+        Activate the green light combination of the action in sumo
+        """
+        self._apply(self._green_states[action])
+
+
+    def set_yellow(self, old_action):
+        """
+        Activate the yellow light combination that ends the green of the old action in sumo
+        """
+        self._apply(self._yellow_states[old_action])
+
+
+    def _apply(self, states):
+        """
+        Send the state of the traffic lights that differ from the state they already show, one call for each of them
+        """
+        for tls, state in states.items():
+            if self._current.get(tls) != state:
+                traci.trafficlight.setRedYellowGreenState(tls, state)
+                self._current[tls] = state
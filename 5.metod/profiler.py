@@ -0,0 +1,88 @@
+import os
+import timeit
+
+import traci
+
+# domains of traci whose functions are profiled, together with the functions of the module itself
+TRACI_DOMAINS = ("simulation", "vehicle", "edge", "lane", "junction", "trafficlight", "lanearea")
+TRACI_FUNCTIONS = ("start", "load", "simulationStep", "close")
+
+
+class TraciProfiler:
+    def __init__(self, domains=TRACI_DOMAINS, functions=TRACI_FUNCTIONS):
+        self._episodes = []  # (episode, stats of the episode)
+        self._stats = {}  # function -> [calls, seconds, bytes] of the current episode
+        self._bytes = 0  # bytes exchanged with sumo so far, only counted on a socket connection
+        self._active = False  # a profiled call is running, the calls it makes are part of it
+        for name in functions:
+            if hasattr(traci, name):
+                setattr(traci, name, self._wrap(name, getattr(traci, name)))
+        for domain_name in domains:
+            domain = getattr(traci, domain_name, None)
+            if domain is None:
+                continue
+            for name in dir(domain):
+                function = getattr(domain, name)
+                if not name.startswith("_") and callable(function):
+                    setattr(domain, name, self._wrap(domain_name + "." + name, function))
+        self._count_bytes()
+
+
+    def start_episode(self, episode):
+        """
+        Gather the stats of the calls made from now on under a new episode
+        """
+        self._stats = {}
+        self._episodes.append((episode, self._stats))
+
+
+    def save(self, path, filename='traci_profile'):
+        """
+        Write the stats of every episode to txt, the functions sorted by their cumulative latency
+        """
+        with open(os.path.join(path, filename + '.txt'), "w") as file:
+            for episode, stats in self._episodes:
+                file.write("Episode %d\n" % (episode + 1))
+                file.write("%-45s %10s %12s %12s %14s\n" % ("function", "calls", "total (s)", "mean (ms)", "bytes"))
+                for name, (calls, seconds, n_bytes) in sorted(stats.items(), key=lambda item: item[1][1], reverse=True):
+                    file.write("%-45s %10d %12.3f %12.4f %14d\n" % (name, calls, seconds, seconds / calls * 1000, n_bytes))
+                file.write("\n")
+
+
+    def _wrap(self, name, function):
+        """
+        Function with the same signature that records the calls, the latency and the bytes of the given one
+        """
+        def profiled(*args, **kwargs):
+            if self._active:
+                return function(*args, **kwargs)
+            self._active = True
+            bytes_before = self._bytes
+            start_time = timeit.default_timer()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = timeit.default_timer() - start_time
+                self._active = False
+                stats = self._stats.setdefault(name, [0, 0.0, 0])
+                stats[0] += 1
+                stats[1] += elapsed
+                stats[2] += self._bytes - bytes_before
+        return profiled
+
+
+    def _count_bytes(self):
+        """
+        Count the bytes of every message of the socket connection, libsumo runs inside the process and exchanges none
+        """
+        connection = getattr(traci, "connection", None)
+        if connection is None or not hasattr(connection.Connection, "_sendExact"):
+            return
+        send_exact = connection.Connection._sendExact
+
+        def counted(conn):
+            sent = len(conn._string) + 4  # the message and its length header
+            result = send_exact(conn)
+            self._bytes += sent + len(result._content)
+            return result
+        connection.Connection._sendExact = counted
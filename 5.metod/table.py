@@ -0,0 +1,228 @@
+import numpy as np
+import traci.constants as tc
+import xml.etree.ElementTree as ET
+
+
+class VehicleTable:
+    def __init__(self, incoming_roads, vehicle_types, variables=()):
+        self._incoming_roads = tuple(incoming_roads)
+        self._road_codes = {road_id: code for code, road_id in enumerate(self._incoming_roads)}  # road -> code, -1 = not in the incoming roads
+        self._vehicle_types = tuple(vehicle_types)
+        self._type_codes = {car_type: code for code, car_type in enumerate(self._vehicle_types)}  # type -> code, -1 = unknown type
+        self._with_lane = tc.VAR_LANE_ID in variables
+        self._vclasses = [None] * len(self._vehicle_types)  # type code -> vClass of the type
+        self._type_max_speeds = np.zeros(len(self._vehicle_types))  # type code -> max speed of the type
+        self.start(None)
+
+
+    def start(self, route_file):
+        """
+        Allocate the columns of the new episode, one slot for every car generated in the route file, None = no car
+        """
+        car_types = self._read_route_file(route_file) if route_file is not None else {}
+        car_ids = sorted(car_types)  # slots sorted by id like traci.vehicle.getIDList, so the car that wins a shared cell is the same as in a getIDList loop
+        n_cars = len(car_ids)
+        self._slot_of = {car_id: slot for slot, car_id in enumerate(car_ids)}
+        self._types = np.array([self._type_codes.get(car_types[car_id], -1) for car_id in car_ids], dtype=np.int8)
+        self._max_speeds = np.zeros(n_cars)
+        known = self._types >= 0
+        self._max_speeds[known] = self._type_max_speeds[self._types[known]]  # the max speed of a car is the one of its type
+        self._roads = np.full(n_cars, -1, dtype=np.int8)
+        self._waiting_times = np.zeros(n_cars)
+        self._co2_emissions = np.zeros(n_cars)
+        self._noise_emissions = np.zeros(n_cars)
+        self._positions = np.zeros(n_cars)
+        self._speeds = np.zeros(n_cars)
+        self._lanes = np.full(n_cars, -1, dtype=np.int16) if self._with_lane else None
+        self._on_roads = np.zeros(0, dtype=np.intp)  # slots of the cars in the incoming roads at the last update
+        self._waiting_totals = np.zeros((len(self._incoming_roads), len(self._vehicle_types) + 1))  # running total of the waiting times by road code and type code, the unknown type -1 in the last column
+        self._lane_ids = []  # code -> lane, filled as the cars reach the lanes
+        self._lane_codes = {}
+
+
+    def update(self, vehicles, incoming_cars):
+        """
+        Write the snapshot of the cars in the incoming roads into their slots, every other car is marked as out of the incoming roads
+        """
+        slots = []
+        roads = []
+        values_of = []
+        for car_id, road_id in incoming_cars.items():
+            values = vehicles.get(car_id)
+            if values is None:  # not sent by sumo, not subscribed
+                continue
+            slots.append(self._slot_of[car_id])
+            roads.append(self._road_codes[road_id])
+            values_of.append(values)
+
+        previous = self._on_roads
+        previous_roads = self._roads[previous]
+        previous_waits = self._waiting_times[previous]
+        self._on_roads = slots = np.array(slots, dtype=np.intp)
+        before_roads = self._roads[slots]
+        before_waits = self._waiting_times[slots]
+
+        self._roads[previous] = -1  # only the cars of the last update can be in the incoming roads
+        self._roads[slots] = roads
+        self._waiting_times[slots] = [values[tc.VAR_ACCUMULATED_WAITING_TIME] for values in values_of]
+        self._adjust_waiting_totals(previous, previous_roads, previous_waits, slots, before_roads, before_waits)
+        self._co2_emissions[slots] = [values[tc.VAR_CO2EMISSION] for values in values_of]
+        self._noise_emissions[slots] = [values[tc.VAR_NOISEEMISSION] for values in values_of]
+        self._positions[slots] = [values[tc.VAR_LANEPOSITION] for values in values_of]
+        self._speeds[slots] = [values[tc.VAR_SPEED] for values in values_of]
+        if self._with_lane:
+            self._lanes[slots] = [self._lane_code(values[tc.VAR_LANE_ID]) for values in values_of]
+
+
+    def mask(self, roads=None, types=None):
+        """
+        Boolean mask of the slots of the cars in the given incoming roads (all of them by default) and of the given types
+        """
+        if roads is None:
+            mask = self._roads >= 0
+        else:
+            mask = np.isin(self._roads, [self._road_codes[road_id] for road_id in roads])
+        if types is not None:
+            mask &= np.isin(self._types, [self._type_codes[car_type] for car_type in types])
+        return mask
+
+
+    def waiting_time(self, roads=None, types=None):
+        """
+        Total waiting time of the cars in the given incoming roads (all of them by default) and of the given types, read from the running totals
+        """
+        totals = self._waiting_totals
+        if roads is not None:
+            totals = totals[[self._road_codes[road_id] for road_id in roads]]
+        if types is not None:
+            totals = totals[:, [self._type_codes[car_type] for car_type in types]]
+        return totals.sum()
+
+
+    def _adjust_waiting_totals(self, previous, previous_roads, previous_waits, slots, before_roads, before_waits):
+        """
+        Move the running totals by the cars that left the incoming roads, entered them or changed road or waiting time, the others are not touched
+        """
+        changed = (self._roads[previous] != previous_roads) | (self._waiting_times[previous] != previous_waits)
+        self._add_waiting_times(previous_roads[changed], self._types[previous[changed]], -previous_waits[changed])  # the old value of the car leaves the totals
+        changed = (self._roads[slots] != before_roads) | (self._waiting_times[slots] != before_waits)
+        self._add_waiting_times(self._roads[slots[changed]], self._types[slots[changed]], self._waiting_times[slots[changed]])  # the new value of the car enters the totals
+
+
+    def _add_waiting_times(self, roads, types, waiting_times):
+        """
+        Add the waiting times to the totals of the road and type of every car
+        """
+        if len(roads) == 0:
+            return
+        cells = roads.astype(np.intp) * self._waiting_totals.shape[1] + types % self._waiting_totals.shape[1]  # the unknown type -1 goes to the last column
+        self._waiting_totals += np.bincount(cells, weights=waiting_times, minlength=self._waiting_totals.size).reshape(self._waiting_totals.shape)
+
+
+    def _read_route_file(self, route_file):
+        """
+        Type of every car of the route file by id, with the vClass and max speed of the types, the attributes that never change during the life of a car are never asked to sumo
+        """
+        car_types = {}
+        for _, element in ET.iterparse(route_file):
+            if element.tag == "vType":
+                code = self._type_codes.get(element.get("id"))
+                if code is not None:
+                    self._vclasses[code] = element.get("vClass")
+                    self._type_max_speeds[code] = float(element.get("maxSpeed"))
+            elif element.tag == "vehicle":
+                car_types[element.get("id")] = element.get("type")
+            element.clear()
+        return car_types
+
+
+    def types_of(self, vehicle_classes=(), vehicle_types=()):
+        """
+        Types of the given vClasses and vTypes, read from the route file: a type must be in both lists, an empty list takes every type
+        """
+        return [car_type for code, car_type in enumerate(self._vehicle_types) if (not vehicle_classes or self._vclasses[code] in vehicle_classes) and (not vehicle_types or car_type in vehicle_types)]
+
+
+    def cars_of(self, types):
+        """
+        Ids of the cars of the given types, read from the route file
+        """
+        matching = np.isin(self._types, [self._type_codes[car_type] for car_type in types])
+        return {car_id for car_id, slot in self._slot_of.items() if matching[slot]}
+
+
+    def _lane_code(self, lane_id):
+        """
+        Code of the lane, a new code is given to a lane seen for the first time
+        """
+        code = self._lane_codes.get(lane_id)
+        if code is None:
+            code = len(self._lane_ids)
+            self._lane_codes[lane_id] = code
+            self._lane_ids.append(lane_id)
+        return code
+
+
+    @property
+    def slot_of(self):
+        return self._slot_of
+
+
+    @property
+    def types(self):
+        return self._types
+
+
+    @property
+    def vclasses(self):
+        return self._vclasses
+
+
+    @property
+    def roads(self):
+        return self._roads
+
+
+    @property
+    def waiting_times(self):
+        return self._waiting_times
+
+
+    @property
+    def waiting_totals(self):
+        return self._waiting_totals
+
+
+    @property
+    def co2_emissions(self):
+        return self._co2_emissions
+
+
+    @property
+    def noise_emissions(self):
+        return self._noise_emissions
+
+
+    @property
+    def positions(self):
+        return self._positions
+
+
+    @property
+    def speeds(self):
+        return self._speeds
+
+
+    @property
+    def max_speeds(self):
+        return self._max_speeds
+
+
+    @property
+    def lanes(self):
+        return self._lanes
+
+
+    @property
+    def lane_ids(self):
+        return self._lane_ids
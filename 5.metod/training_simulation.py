@@ -1,29 +1,39 @@
 import traci
+import traci.constants as tc
 import numpy as np
 import random
 import timeit
 import os
+import sys
 
-# phase codes based on environment.net.xml
-PHASE_01_GREEN = 0
-PHASE_01_YELLOW = 1
-PHASE_01_RED = 2
-
-PHASE_02_GREEN = 0
-PHASE_02_YELLOW = 1
-PHASE_02_RED = 2
-
-PHASE_03_GREEN = 0
-PHASE_03_YELLOW = 1
-PHASE_03_RED = 2
+from metrics import StepMetrics
+from subscription import VehicleSubscription, VEHICLE_VARIABLES
+from tracker import VehicleTracker
+from table import VehicleTable
+from phases import PhaseTable
+from encoder import StateEncoder, VehicleSnapshot, ObservationTimer
+from reward import WaitingReward
+from intersection import incoming_roads_of, observes_lanes
 
+# vehicle types of the route file, in the order of their codes in the vehicle table
+VEHICLE_TYPES = ["standart_car", "bus", "taxi"]
 
 
 class Simulation:
-    def __init__(self, Model, Memory, TrafficGen, sumo_cmd, gamma, max_steps, green_duration, yellow_duration, num_states, num_actions, training_epochs):
+    def __init__(self, Model, Memory, TrafficGen, NetIndex, Intersections, sumo_cmd, gamma, max_steps, green_duration, yellow_duration, num_states, num_actions, training_epochs, persistent_connection=False, Detectors=None, road_subscription=False, observed_classes=(), observed_types=(), sampling_interval=1, metrics_level='full', full_metrics_every=0, observation_budget=0.005):
         self._Model = Model
         self._Memory = Memory
         self._TrafficGen = TrafficGen
+        self._NetIndex = NetIndex
+        self._incoming_roads = incoming_roads_of(Intersections)  # roads of all the intersections, where the statistics of every step are gathered
+        self._Intersection = Intersections[0]  # the intersection controlled by the agent
+        self._Detectors = Detectors  # lane-area detectors of the cells, when the state is read from them
+        self._sampling_interval = sampling_interval  # steps between two samples of the statistics, 1 = every step
+        self._configured_metrics_level = metrics_level  # off, reward or full
+        self._full_metrics_every = full_metrics_every  # every n-th episode gathers the full statistics, 0 = never
+        self._metrics_level = metrics_level  # level of the current episode
+        self._reward_episodes = []  # episodes of the values of the reward stores
+        self._metrics_episodes = []  # episodes of the values of the other stores
         self._gamma = gamma
         self._step = 0
         self._sumo_cmd = sumo_cmd
@@ -40,6 +50,21 @@ class Simulation:
         self._co2_emission_store = []
         self._mean_speed_store = []
         self._noise_emission_store = []
+        self._Subscription = VehicleSubscription(self._incoming_roads, VEHICLE_VARIABLES + ((tc.VAR_LANE_ID,) if observes_lanes(Intersections) else ()), on_roads_only=road_subscription)  # with a road subscription the cars are only read while they are on the incoming roads
+        self._observed_classes = observed_classes  # the episodes without the full statistics only subscribe the cars of these vClasses and vTypes, empty = all of them
+        self._observed_types = observed_types
+        self._read_types = set(self._Intersection.reward_weights) | (set(self._Intersection.occupancy) if Detectors is None else set())  # types read by the reward, and by the state unless it comes from the detectors
+        self._Tracker = VehicleTracker(self._incoming_roads)
+        self._Table = VehicleTable(self._incoming_roads, VEHICLE_TYPES, self._Subscription.variables)
+        self._Phases = PhaseTable(NetIndex, self._Intersection)  # light states of the actions, compiled from the net
+        self._ObservationTimer = ObservationTimer(observation_budget)  # time taken by the observation of every decision
+        self._Snapshot = VehicleSnapshot(NetIndex, self._incoming_roads)  # cars of the incoming roads at the last decision, read by the state encoders
+        self._Encoder = StateEncoder(self._Intersection, NetIndex, self._incoming_roads, VEHICLE_TYPES, detectors=Detectors is not None)  # cells of the state, compiled from the intersection
+        self._Reward = WaitingReward(self._Intersection, self._incoming_roads, VEHICLE_TYPES)  # weights of the waiting times in the reward, compiled from the intersection
+        self._StepMetrics = StepMetrics(self._incoming_roads)
+        self._persistent_connection = persistent_connection
+        self._sumo_running = False
+        self._startup_time = 0
 
 
     def run(self, episode, epsilon):
@@ -50,16 +75,14 @@ class Simulation:
 
         # first, generate the route file for this simulation and set up sumo
         self._TrafficGen.generate_routefile(seed=episode)
-        traci.start(self._sumo_cmd)
-        print("Simulating...")
+        self._metrics_level = self._level_of_episode(episode)  # before sumo is started, the level decides the cars to subscribe
+        startup_start_time = timeit.default_timer()
+        self._start_sumo()
+        self._startup_time = round(timeit.default_timer() - startup_start_time, 2)
+        print("Simulating... (statistics: " + self._metrics_level + ")")
 
         # inits
         self._step = 0
-        self._waiting_times_all = {}
-        self._waiting_times_bus_and_taxi = {}
-        self._waiting_times_for_reward = {}
-        self._co2_emissions = {}
-        self._noise_emissions = {}
         self._sum_neg_reward = 0
         self._sum_queue_length = 0
         self._sum_waiting_time_all = 0
@@ -73,13 +96,12 @@ class Simulation:
 
         while self._step < self._max_steps:
 
-            # get current state of the intersection
-            current_state = self._get_state()
+            # get current state of the intersection and the waiting times for the reward, from one snapshot of the vehicles
+            current_state, current_total_wait_for_reward = self._observe()
             
 
             # calculate reward of previous action: (change in cumulative waiting time between actions)
             # waiting time = seconds waited by a car since the spawn in the environment, cumulated for every car in incoming lanes
-            current_total_wait_for_reward = self._collect_waiting_times_for_reward()
             reward = old_total_wait_for_reward - current_total_wait_for_reward
 
             # saving the data into the memory
@@ -107,9 +129,11 @@ class Simulation:
             if reward < 0:
                 self._sum_neg_reward += reward
 
-        self._save_episode_stats()
+        self._save_episode_stats(episode)
+        print(self._ObservationTimer.end_episode())
         print("Total reward:", self._sum_neg_reward, "- Epsilon:", round(epsilon, 2))
-        traci.close()
+        if not self._persistent_connection:
+            self.close()
         simulation_time = round(timeit.default_timer() - start_time, 1)
 
         print("Training...")
@@ -121,6 +145,49 @@ class Simulation:
         return simulation_time, training_time
 
 
+    def _start_sumo(self):
+        """
+        Start sumo for a new episode, in persistent mode the running sumo only loads the new simulation instead of being spawned again
+        """
+        if self._persistent_connection and self._sumo_running:
+            traci.load(self._sumo_cmd[1:])  # same options as traci.start, without the binary
+        else:
+            traci.start(self._sumo_cmd)
+            self._sumo_running = True
+        self._Table.start(self._TrafficGen.route_file)  # ids, types and max speeds are cached from the route file
+        self._Subscription.start(self._observed_cars())
+        self._Tracker.start()
+        self._Snapshot.start()
+        self._ObservationTimer.start_episode()
+        self._Phases.start()
+        if self._Detectors is not None:
+            self._Detectors.start()
+
+
+    def _observed_cars(self):
+        """
+        Cars subscribed in the episode, None = every car: the full statistics are gathered on every car, the other episodes only need the cars of the observed vClasses and vTypes
+        """
+        if not self._observed_classes and not self._observed_types:
+            return None
+        observed_types = self._Table.types_of(self._observed_classes, self._observed_types)
+        missing = sorted(self._read_types - set(observed_types))
+        if missing:
+            sys.exit("observed_classes and observed_types leave out types read by the state or the reward: " + ", ".join(missing))
+        if self._metrics_level == 'full':
+            return None
+        return self._Table.cars_of(observed_types)
+
+
+    def close(self):
+        """
+        Close the sumo kept running between the episodes in persistent mode
+        """
+        if self._sumo_running:
+            traci.close()
+            self._sumo_running = False
+
+
     def _simulate(self, steps_todo):
         """
         Execute steps in sumo while gathering statistics
@@ -128,133 +195,31 @@ class Simulation:
         if (self._step + steps_todo) >= self._max_steps:  # do not do more steps than the maximum allowed number of steps
             steps_todo = self._max_steps - self._step
 
+        sampling_interval = self._sampling_interval if self._metrics_level == 'full' else steps_todo  # without statistics sumo runs up to the next decision with a single call
         while steps_todo > 0:
-            traci.simulationStep()  # simulate 1 step in sumo
-            self._step += 1 # update the step counter
-            steps_todo -= 1
-            queue_length = self._get_queue_length()
-            self._sum_queue_length += queue_length
-            total_waiting_time_bus_and_taxi = self._collect_waiting_times_bus_and_taxi()
-            self._sum_waiting_time_bus_and_taxi += total_waiting_time_bus_and_taxi
-            total_waiting_time_all = self._collect_waiting_times_all()
-            self._sum_waiting_time_all += total_waiting_time_all
-            total_co2_emission = self._co2_emission_value()
-            self._sum_co2_emission += total_co2_emission
-            total_mean_speed = self._get_mean_speed()
-            self._sum_mean_speed += total_mean_speed
-            total_noise_emission = self._get_noise_emission()
-            self._sum_noise_emission += total_noise_emission
-            
-    def _get_noise_emission(self):
-        
-        incoming_roads = ["E2", "E3", "E4"]
-        car_list = traci.vehicle.getIDList()
-        for car_id in car_list:
-            noise_emission = traci.vehicle.getNoiseEmission(car_id)
-            road_id = traci.vehicle.getRoadID(car_id)
-            if road_id in incoming_roads:
-                self._noise_emissions[car_id] = noise_emission
-            else:
-                if car_id in self._noise_emissions:
-                    del self._noise_emissions[car_id]
-        total_noise_emission = sum(self._noise_emissions.values())
-        return total_noise_emission
-            
-            
-    def _collect_waiting_times_all(self):
-        
-        incoming_roads = ["E2", "E3", "E4"]
-        car_list = traci.vehicle.getIDList()
-        for car_id in car_list:
-            wait_time = traci.vehicle.getAccumulatedWaitingTime(car_id)
-            road_id = traci.vehicle.getRoadID(car_id)  # get the road id where the car is located
-            if road_id in incoming_roads:  # consider only the waiting times of cars in incoming roads
-                self._waiting_times_all[car_id] = wait_time
-            else:
-                if car_id in self._waiting_times_all: # a car that was tracked has cleared the intersection
-                    del self._waiting_times_all[car_id] 
-        total_waiting_time_all = sum(self._waiting_times_all.values())
-        return total_waiting_time_all
-
-
-    def _collect_waiting_times_bus_and_taxi(self):
-        """
-        Retrieve the waiting time of every car in the incoming roads
-        """
-        incoming_roads = ["E2", "E3", "E4"]
-        car_list = traci.vehicle.getIDList()
-        for car_id in car_list:
-            car_type = traci.vehicle.getTypeID(car_id)
-            if car_type == "bus":
-                wait_time = traci.vehicle.getAccumulatedWaitingTime(car_id)
-                road_id = traci.vehicle.getRoadID(car_id)  # get the road id where the car is located
-                if road_id in incoming_roads:  # consider only the waiting times of cars in incoming roads
-                    self._waiting_times_bus_and_taxi[car_id] = wait_time
-                else:
-                    if car_id in self._waiting_times_bus_and_taxi: # a car that was tracked has cleared the intersection
-                        del self._waiting_times_bus_and_taxi[car_id]
-            elif car_type == "taxi":
-                wait_time = traci.vehicle.getAccumulatedWaitingTime(car_id)
-                road_id = traci.vehicle.getRoadID(car_id)
-                if road_id in incoming_roads:
-                    self._waiting_times_bus_and_taxi[car_id] = wait_time
-                else:
-                    if car_id in self._waiting_times_bus_and_taxi:
-                        del self._waiting_times_bus_and_taxi[car_id]
-        total_waiting_time_bus_and_taxi = sum(self._waiting_times_bus_and_taxi.values())
-        return total_waiting_time_bus_and_taxi
+            sampled_steps = min(sampling_interval, steps_todo)  # steps represented by the sample taken at the end of this chunk
+            traci.simulationStep(float(self._step + sampled_steps))  # simulate the steps of the chunk in sumo with a single call (a float target time, traci warns on ints from 1000 on)
+            self._Subscription.update()  # snapshot of the vehicles, read by every collector of this step
+            self._Tracker.update(self._Subscription.arrived, self._Subscription.roads)
+            self._Table.update(self._Subscription.vehicles, self._Tracker.incoming_cars)
+            self._step += sampled_steps # update the step counter
+            steps_todo -= sampled_steps
+            if self._metrics_level != 'full':  # the reward is read from the vehicle table at the decision
+                continue
+            self._StepMetrics.collect(self._Table, self._Subscription.roads)  # all the statistics of this step from the vehicle table
+            self._sum_queue_length += self._StepMetrics.queue_length * sampled_steps
+            self._sum_waiting_time_bus_and_taxi += self._StepMetrics.waiting_time_bus_and_taxi * sampled_steps
+            self._sum_waiting_time_all += self._StepMetrics.waiting_time_all * sampled_steps
+            self._sum_co2_emission += self._StepMetrics.co2_emission * sampled_steps
+            self._sum_mean_speed += self._StepMetrics.mean_speed * sampled_steps
+            self._sum_noise_emission += self._StepMetrics.noise_emission * sampled_steps
     
     
     def _collect_waiting_times_for_reward(self):
         """
         Retrieve the waiting time of every car in the incoming roads
         """
-        incoming_roads = ["E2", "E3", "E4"]
-        car_list = traci.vehicle.getIDList()
-        for car_id in car_list:
-            car_type = traci.vehicle.getTypeID(car_id)
-            if car_type == "standart_car":
-                wait_time = traci.vehicle.getAccumulatedWaitingTime(car_id)
-                road_id = traci.vehicle.getRoadID(car_id)
-                if road_id in incoming_roads:
-                    self._waiting_times_for_reward[car_id] = wait_time * 1
-                else:
-                    if car_id in self._waiting_times_for_reward:
-                        del self._waiting_times_for_reward[car_id]
-            elif car_type == "bus":
-                wait_time = traci.vehicle.getAccumulatedWaitingTime(car_id)
-                road_id = traci.vehicle.getRoadID(car_id)  # get the road id where the car is located
-                if road_id in incoming_roads:  # consider only the waiting times of cars in incoming roads
-                    self._waiting_times_for_reward[car_id] = wait_time * 2
-                else:
-                    if car_id in self._waiting_times_for_reward: # a car that was tracked has cleared the intersection
-                        del self._waiting_times_for_reward[car_id]
-            elif car_type == "taxi":
-                wait_time = traci.vehicle.getAccumulatedWaitingTime(car_id)
-                road_id = traci.vehicle.getRoadID(car_id)
-                if road_id in incoming_roads:
-                    self._waiting_times_for_reward[car_id] = wait_time * 1
-                else:
-                    if car_id in self._waiting_times_for_reward:
-                        del self._waiting_times_for_reward[car_id]
-        total_waiting_time_for_reward = sum(self._waiting_times_for_reward.values())
-        return total_waiting_time_for_reward
-    
-    
-    def _co2_emission_value(self):
-        
-        incoming_roads = ["E2", "E3", "E4"]
-        car_list = traci.vehicle.getIDList()
-        for car_id in car_list:
-            carbon_dioxide = traci.vehicle.getCO2Emission(car_id)
-            road_id = traci.vehicle.getRoadID(car_id)
-            if road_id in incoming_roads:
-                self._co2_emissions[car_id] = carbon_dioxide
-            else:
-                if car_id in self._co2_emissions:
-                    del self._co2_emissions[car_id]
-        total_co2_emission = sum(self._co2_emissions.values())
-        return total_co2_emission
+        return self._Reward.collect(self._Table)  # waiting time of every type of car, weighted
             
 
 
@@ -272,118 +237,49 @@ class Simulation:
         """
         Activate the correct yellow light combination in sumo
         """
-        yellow_phase_code = old_action * 0 + 1 # obtain the yellow phase code, based on the old action (ref on environment.net.xml)
-        if old_action == 0:
-            traci.trafficlight.setPhase("tl_01", yellow_phase_code)
-        elif old_action == 1:
-            traci.trafficlight.setPhase("tl_02", yellow_phase_code)
-        elif old_action == 2:
-            traci.trafficlight.setPhase("tl_03", yellow_phase_code)
+        self._Phases.set_yellow(old_action)
 
 
     def _set_green_phase(self, action_number):
         """
         Activate the correct green light combination in sumo
         """
-        if action_number == 0:
-            traci.trafficlight.setPhase("tl_01", PHASE_01_GREEN)
-            traci.trafficlight.setPhase("tl_02", PHASE_02_RED)
-            traci.trafficlight.setPhase("tl_03", PHASE_02_RED)
-        elif action_number == 1:
-            traci.trafficlight.setPhase("tl_01", PHASE_01_RED)
-            traci.trafficlight.setPhase("tl_02", PHASE_02_GREEN)
-            traci.trafficlight.setPhase("tl_03", PHASE_03_RED)
-        elif action_number == 2:
-            traci.trafficlight.setPhase("tl_01", PHASE_01_RED)
-            traci.trafficlight.setPhase("tl_02", PHASE_02_RED)
-            traci.trafficlight.setPhase("tl_03", PHASE_03_GREEN)
-
-
-
-    def _get_queue_length(self):
+        self._Phases.set_green(action_number)
+
+
+    def _observe(self):
         """
-        Retrieve the number of cars with speed = 0 in every incoming lane
+        Read the vehicles once, then build the state and the waiting time for the reward of the intersection from them
         """
-        
-        halt_dogu = traci.edge.getLastStepHaltingNumber("E2")
-        halt_kuzey = traci.edge.getLastStepHaltingNumber("E3")
-        halt_batı = traci.edge.getLastStepHaltingNumber("E4")
-        queue_length = halt_dogu + halt_kuzey + halt_batı
-        return queue_length
-    
-    def _get_mean_speed(self):
-        
-        mean_speed_dogu = traci.edge.getLastStepMeanSpeed("E2")
-        mean_speed_kuzey = traci.edge.getLastStepMeanSpeed("E3")
-        mean_speed_batı = traci.edge.getLastStepMeanSpeed("E4")
-        total_mean_speed = mean_speed_dogu + mean_speed_kuzey + mean_speed_batı
-        return total_mean_speed
+        start_time = timeit.default_timer()
+        if self._Detectors is not None:
+            self._Detectors.update()
+        self._Snapshot.take(self._Table)
+        observation = self._get_state(), self._collect_waiting_times_for_reward()
+        self._ObservationTimer.record(timeit.default_timer() - start_time)
+        return observation
+
+
+    def _get_detector_state(self):
+        """
+        Retrieve the state of the intersection from the lane-area detectors, in the form of cell occupancy
+        """
+        cells = self._Detectors.cells(0)  # cells of the intersection among the cells of all the intersections
+        state = np.zeros(self._num_states)
+        state[0:self._Encoder.num_cells] = self._Detectors.occupancy[cells]  # share of the cell covered by cars
+        if self._Intersection.speed_channel != 'none':
+            state[self._Encoder.num_cells:2 * self._Encoder.num_cells] = self._Detectors.speed[cells]  # mean speed of the cars of the cell, relative to the max speed of the lane
+        return state
+
 
     def _get_state(self):
         """
         Retrieve the state of the intersection from sumo, in the form of cell occupancy
         """
-        state = np.zeros(self._num_states)
-       
-        car_list = traci.vehicle.getIDList()
-
-        for car_id in car_list:
-            lane_pos = traci.vehicle.getLanePosition(car_id)
-            road_id = traci.vehicle.getRoadID(car_id)
-            lane_pos = 300 - lane_pos  # inversion of lane pos, so if the car is close to the traffic light -> lane_pos = 0 --- 300 = max len of a road
-
-            # distance in meters from the traffic light -> mapping into cells
-            if lane_pos < 5:
-                lane_cell = 0
-            elif lane_pos < 10:
-                lane_cell = 1
-            elif lane_pos < 15:
-                lane_cell = 2
-            elif lane_pos < 20:
-                lane_cell = 3
-            elif lane_pos < 30:
-                lane_cell = 4
-            elif lane_pos < 50:
-                lane_cell = 5
-            elif lane_pos < 100:
-                lane_cell = 6
-            elif lane_pos < 150:
-                lane_cell = 7
-            elif lane_pos < 200:
-                lane_cell = 8
-            elif lane_pos <= 300:
-                lane_cell = 9
-
-            # finding the road where the car is located 
-            
-            if road_id == "E2":
-                road_group = 0
-            elif road_id == "E3":
-                road_group = 1
-            elif road_id == "E4":
-                road_group = 2
-            else:
-                road_group = -1
-
-            if road_group >= 1 and road_group <= 2:
-                car_position = int(str(road_group) + str(lane_cell))  # composition of the two postion ID to create a number in interval 0-29
-                valid_car = True
-            elif road_group == 0:
-                car_position = lane_cell
-                valid_car = True
-            else:
-                valid_car = False  # flag for not detecting cars crossing the intersection or driving away from it
-
-            if valid_car:
-                car_speed = float(traci.vehicle.getSpeed(car_id) / traci.vehicle.getMaxSpeed(car_id))
-                a = str(car_speed)
-                x = len(a.split(".")[0]) + 1
-                y = 1
-                z = x + y
-                state[car_position] = 1  # write the position of the car car_id in the state array in the form of "cell occupied"
-                state[car_position + 30] = a[0:z]
+        if self._Detectors is not None:
+            return self._get_detector_state()
 
-        return state
+        return self._Encoder.observe(self._Snapshot)
 
 
     def _replay(self):
@@ -414,11 +310,26 @@ class Simulation:
             self._Model.train_batch(x, y)  # train the NN
 
 
-    def _save_episode_stats(self):
+    def _level_of_episode(self, episode):
+        """
+        Level of the statistics gathered in the episode, the periodic full episodes override the configured level
+        """
+        if self._full_metrics_every > 0 and (episode + 1) % self._full_metrics_every == 0:
+            return 'full'
+        return self._configured_metrics_level
+
+
+    def _save_episode_stats(self, episode):
         """
-        Save the stats of the episode to plot the graphs at the end of the session
+        Save the stats of the episode to plot the graphs at the end of the session, only the ones gathered at the level of the episode
         """
+        if self._metrics_level == 'off':
+            return
         self._reward_store.append(self._sum_neg_reward)  # how much negative reward in this episode
+        self._reward_episodes.append(episode)
+        if self._metrics_level != 'full':
+            return
+        self._metrics_episodes.append(episode)
         self._cumulative_wait_store_all.append(self._sum_waiting_time_all)  # total number of seconds waited by cars in this episode
         self._cumulative_wait_store_bus_and_taxi.append(self._sum_waiting_time_bus_and_taxi)
         self._avg_queue_length_store.append(self._sum_queue_length / self._max_steps)  # average number of queued cars per step, in this episode
@@ -427,6 +338,26 @@ class Simulation:
         self._noise_emission_store.append(self._sum_noise_emission)
 
 
+    @property
+    def startup_time(self):
+        return self._startup_time
+
+
+    @property
+    def observation_time_store(self):
+        return self._ObservationTimer.max_time_store
+
+
+    @property
+    def reward_episodes(self):
+        return self._reward_episodes
+
+
+    @property
+    def metrics_episodes(self):
+        return self._metrics_episodes
+
+
     @property
     def reward_store(self):
         return self._reward_store
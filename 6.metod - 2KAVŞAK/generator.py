@@ -5,6 +5,7 @@ class TrafficGenerator:
     def __init__(self, max_steps, n_cars_generated):
         self._n_cars_generated = n_cars_generated  # how many cars per episode
         self._max_steps = max_steps
+        self._route_file = "intersection/bursa.rou.xml"
 
     def generate_routefile(self, seed):
         """
@@ -28,7 +29,7 @@ class TrafficGenerator:
         car_gen_steps = np.rint(car_gen_steps)  # round every value to int -> effective steps when a car will be generated
 
         # produce the file for cars generation, one car per line
-        with open("intersection/bursa.rou.xml", "w") as routes:
+        with open(self._route_file, "w") as routes:
             print("""<routes>
             <vType accel="1.0" decel="4.5" vClass= "passenger" id="standart_car" length="4.0" minGap="2.5" maxSpeed="13" sigma="0.5" color= "cyan" />
             <vType accel="1.0" decel="4.5" vClass= "bus" id="bus" length="8.0" minGap="2.5" maxSpeed="8" sigma="0.5" color= "red" />
@@ -235,3 +236,7 @@ class TrafficGenerator:
                                     print('    <vehicle id="taxi_gd1_%i" type="taxi" route="gd1" depart="%s" departLane="random" departSpeed="8" />' % (car_counter, step), file=routes)
 
             print("</routes>", file=routes)
+
+    @property
+    def route_file(self):
+        return self._route_file
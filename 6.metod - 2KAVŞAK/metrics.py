@@ -0,0 +1,65 @@
+import traci.constants as tc
+
+
+class StepMetrics:
+    def __init__(self, incoming_roads, public_types=("bus", "taxi")):
+        self._incoming_roads = tuple(incoming_roads)
+        self._public_types = tuple(public_types)
+        self._queue_length = 0
+        self._waiting_time_all = 0
+        self._waiting_time_bus_and_taxi = 0
+        self._co2_emission = 0
+        self._mean_speed = 0
+        self._noise_emission = 0
+
+
+    def collect(self, table, roads):
+        """
+        Compute every statistic of the last step from the columns of the vehicle table
+        """
+        self._waiting_time_all = table.waiting_time()  # running totals kept by the vehicle table
+        self._waiting_time_bus_and_taxi = table.waiting_time(types=self._public_types)
+        on_roads = table.mask()  # the cars in the incoming roads
+        co2_emission = table.co2_emissions[on_roads].sum()
+        noise_emission = table.noise_emissions[on_roads].sum()
+
+        queue_length = 0
+        mean_speed = 0
+        for road_id in self._incoming_roads:  # halting number and mean speed of the roads arrive with the simulation step
+            queue_length += roads[road_id][tc.LAST_STEP_VEHICLE_HALTING_NUMBER]
+            mean_speed += roads[road_id][tc.LAST_STEP_MEAN_SPEED]
+
+        self._queue_length = queue_length
+        self._co2_emission = co2_emission
+        self._mean_speed = mean_speed
+        self._noise_emission = noise_emission
+
+
+    @property
+    def queue_length(self):
+        return self._queue_length
+
+
+    @property
+    def waiting_time_all(self):
+        return self._waiting_time_all
+
+
+    @property
+    def waiting_time_bus_and_taxi(self):
+        return self._waiting_time_bus_and_taxi
+
+
+    @property
+    def co2_emission(self):
+        return self._co2_emission
+
+
+    @property
+    def mean_speed(self):
+        return self._mean_speed
+
+
+    @property
+    def noise_emission(self):
+        return self._noise_emission
@@ -0,0 +1,39 @@
+import traci.constants as tc
+
+
+class VehicleTracker:
+    def __init__(self, incoming_roads):
+        self._incoming_roads = tuple(incoming_roads)
+        self._on_road = {}
+        self._road_of = {}
+
+
+    def start(self):
+        """
+        Forget the vehicles of the previous episode
+        """
+        self._on_road = {road_id: frozenset() for road_id in self._incoming_roads}  # cars on every incoming road
+        self._road_of = {}  # incoming road of every tracked car
+
+
+    def update(self, arrived, roads):
+        """
+        Apply the road changes and the arrivals of the last step, using the vehicle lists of the incoming roads
+        """
+        for road_id in self._incoming_roads:
+            old_cars = self._on_road[road_id]
+            new_cars = frozenset(roads[road_id][tc.LAST_STEP_VEHICLE_ID_LIST])
+            for car_id in old_cars - new_cars:  # the car has cleared the road
+                if self._road_of.get(car_id) == road_id:
+                    del self._road_of[car_id]
+            for car_id in new_cars - old_cars:  # the car has entered the road
+                self._road_of[car_id] = road_id
+            self._on_road[road_id] = new_cars
+
+        for car_id in arrived:  # a car that left the network is never tracked again
+            self._road_of.pop(car_id, None)
+
+
+    @property
+    def incoming_cars(self):
+        return self._road_of
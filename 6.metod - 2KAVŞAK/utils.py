@@ -3,6 +3,8 @@ from sumolib import checkBinary
 import os
 import sys
 
+from intersection import read_intersections
+
 
 def import_train_configuration(config_file):
     """
@@ -12,11 +14,23 @@ def import_train_configuration(config_file):
     content.read(config_file)
     config = {}
     config['gui'] = content['simulation'].getboolean('gui')
+    config['backend'] = content['simulation'].get('backend', 'traci')
     config['total_episodes'] = content['simulation'].getint('total_episodes')
     config['max_steps'] = content['simulation'].getint('max_steps')
     config['n_cars_generated'] = content['simulation'].getint('n_cars_generated')
     config['green_duration'] = content['simulation'].getint('green_duration')
     config['yellow_duration'] = content['simulation'].getint('yellow_duration')
+    config['persistent_connection'] = content['simulation'].getboolean('persistent_connection', fallback=False)
+    config['observation'] = content['simulation'].get('observation', 'vehicles')
+    if config['observation'] not in ('vehicles', 'roads', 'detectors'):
+        sys.exit("unknown observation '" + config['observation'] + "', use vehicles, roads or detectors")
+    config['observed_classes'] = [name.strip() for name in content['simulation'].get('observed_classes', '').split(',') if name.strip()]
+    config['observed_types'] = [name.strip() for name in content['simulation'].get('observed_types', '').split(',') if name.strip()]
+    config['sampling_interval'] = content['simulation'].getint('sampling_interval', fallback=1)
+    config['metrics_level'] = content.get('metrics', 'level', fallback='full')
+    config['full_metrics_every'] = content.getint('metrics', 'full_every', fallback=0)
+    config['profile_traci'] = content.getboolean('metrics', 'profile_traci', fallback=False)
+    config['observation_budget'] = content.getfloat('metrics', 'observation_budget_ms', fallback=5) / 1000  # from ms to s
     config['num_layers'] = content['model'].getint('num_layers')
     config['width_layers'] = content['model'].getint('width_layers')
     config['batch_size'] = content['model'].getint('batch_size')
@@ -24,12 +38,13 @@ def import_train_configuration(config_file):
     config['training_epochs'] = content['model'].getint('training_epochs')
     config['memory_size_min'] = content['memory'].getint('memory_size_min')
     config['memory_size_max'] = content['memory'].getint('memory_size_max')
-    config['num_states_1'] = content['agent'].getint('num_states_1')
     config['num_actions_1'] = content['agent'].getint('num_actions_1')
     config['gamma'] = content['agent'].getfloat('gamma')  
     config['models_path_name'] = content['dir']['models_path_name']
     config['sumocfg_file_name'] = content['dir']['sumocfg_file_name']
-    config['num_states_2'] = content['gokdere'].getint('num_states_2')   
+    config['intersections'] = read_intersections(content)  # incoming roads, cells, traffic lights and reward of every intersection
+    if config['observation'] == 'detectors' and any(intersection.layout == 'lanes' for intersection in config['intersections']):
+        sys.exit("the lane-area detectors only observe the cells layout, use observation = vehicles with layout = lanes")
     config['num_actions_2'] = content['gokdere'].getint('num_actions_2')
     return config
 
@@ -42,19 +57,39 @@ def import_test_configuration(config_file):
     content.read(config_file)
     config = {}
     config['gui'] = content['simulation'].getboolean('gui')
+    config['backend'] = content['simulation'].get('backend', 'traci')
     config['max_steps'] = content['simulation'].getint('max_steps')
     config['n_cars_generated'] = content['simulation'].getint('n_cars_generated')
     config['episode_seed'] = content['simulation'].getint('episode_seed')
     config['green_duration'] = content['simulation'].getint('green_duration')
     config['yellow_duration'] = content['simulation'].getint('yellow_duration')
-    config['num_states'] = content['agent'].getint('num_states')
     config['num_actions'] = content['agent'].getint('num_actions')
     config['sumocfg_file_name'] = content['dir']['sumocfg_file_name']
+    config['intersections'] = read_intersections(content)  # incoming roads, cells, traffic lights and reward of every intersection
     config['models_path_name'] = content['dir']['models_path_name']
     config['model_to_test'] = content['dir'].getint('model_to_test') 
     return config
 
 
+def set_backend(backend, gui):
+    """
+    Select the library used to drive sumo: traci talks to a sumo process through a socket, libsumo runs sumo in-process
+    """
+    if backend == 'libsumo' and gui == True:
+        print("libsumo has no gui, falling back to traci")
+        backend = 'traci'
+
+    # "import traci" loads libsumo with the same api when this variable is set, so it must be done before the simulation is imported
+    if backend == 'libsumo':
+        os.environ['LIBSUMO_AS_TRACI'] = '1'
+    elif backend == 'traci':
+        os.environ.pop('LIBSUMO_AS_TRACI', None)
+    else:
+        sys.exit("unknown backend '" + backend + "', use traci or libsumo")
+
+    return backend
+
+
 def set_sumo(gui, sumocfg_file_name, max_steps):
     """
     Configure various parameters of SUMO
@@ -0,0 +1,22 @@
+import numpy as np
+
+from intersection import check_types
+
+
+class WaitingReward:
+    def __init__(self, Intersection, incoming_roads, vehicle_types):
+        check_types(Intersection, vehicle_types)
+        self._road_codes = [list(incoming_roads).index(road_id) for road_id in Intersection.incoming_roads]  # rows of the intersection in the totals of the vehicle table
+        self._weights = np.array([Intersection.reward_weights.get(car_type, 0) for car_type in vehicle_types] + [0], dtype=float)  # weight of the waiting time by type code, the unknown type -1 in the last entry
+
+
+    def collect(self, table):
+        """
+        Weighted waiting time of the cars in the incoming roads of the intersection, one dot product over the running totals of the vehicle table
+        """
+        return table.waiting_totals[self._road_codes].sum(axis=0).dot(self._weights)
+
+
+    @property
+    def weights(self):
+        return self._weights
@@ -7,16 +7,22 @@ class Visualization:
             self._dpi = dpi
 
 
-    def save_data_and_plot(self, data, filename, xlabel, ylabel):
+    def save_data_and_plot(self, data, filename, xlabel, ylabel, episodes=None):
         """
         Produce a plot of performance of the agent over the session and save the relative data to txt
         """
+        if not data:  # nothing was gathered at the level of the statistics
+            return
+
         min_val = min(data)
         max_val = max(data)
 
         plt.rcParams.update({'font.size': 24})  # set bigger font size
 
-        plt.plot(data)
+        if episodes is None:
+            plt.plot(data)
+        else:
+            plt.plot(episodes, data)  # only some episodes gathered the data
         plt.ylabel(ylabel)
         plt.xlabel(xlabel)
         plt.margins(0)